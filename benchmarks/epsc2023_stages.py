@@ -0,0 +1,55 @@
+import os
+import sys
+import argparse
+import tempfile
+import warnings
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'epsc2023'))
+from fits_reader import LocalFITS
+from products import clean, orient, invalid_mask
+from normalize import nanpercentiles
+from indexer import PERCENTILES, CUBES, IMAGES, Stats, compute_stats
+from panels import COLORMAPS, panel_images
+from pyramid import Pyramid
+from figures import grid_figure
+
+from synthetic import generated, write_fits
+from stages import Stages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the stages of the EPSC 2023 app on one FITS file')
+    parser.add_argument('path', nargs='?', help='FITS file, a synthetic one is generated if not given')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'conferences-benchmarks'))
+    parser.add_argument('--wavelengths', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=512)
+    parser.add_argument('--cols', type=int, default=512)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Print the timings as JSON')
+    args = parser.parse_args()
+
+    path = args.path or generated(args.data_dir, 'synthetic.fits', write_fits,
+                                  wavelengths=args.wavelengths, rows=args.rows, cols=args.cols)
+    index = args.wavelengths // 3
+    stages = Stages(args.repeat)
+
+    # Reads of the FITS file come from the page cache after the first repeat,
+    # as they do for the app once a file has been opened
+    data = stages.time('load: open', lambda: LocalFITS(path))
+    stages.time('load: planes', lambda: [data.plane(name, index) for name in CUBES] + [data.image(name) for name in IMAGES])
+    cubes = stages.time('load: cubes', lambda: {name: data.cube(name) for name in CUBES})
+
+    cleaned = stages.time('clean: cubes', lambda: {name: clean(cube) for name, cube in cubes.items()})
+    stages.time('clean: orient planes', lambda: [orient(clean(data.plane(name, index))) for name in CUBES])
+    stages.time('clean: invalid mask', lambda: invalid_mask(cleaned['albedo'], cleaned['dolp']))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        stages.time('percentiles: cubes', lambda: [nanpercentiles(cube, PERCENTILES) for cube in cleaned.values()])
+        stats = Stats(stages.time('percentiles: sidecar', lambda: compute_stats(data)))
+
+        panels = stages.time('figure: panels', lambda: panel_images(data, stats, index))
+        pyramids = stages.time('figure: pyramids', lambda: [
+            (title, Pyramid(image, COLORMAPS.get(name, 'jet'))) for title, name, image in panels])
+        stages.time('figure: grid', lambda: grid_figure(pyramids).to_json())
+    stages.report(args.json)
@@ -0,0 +1,65 @@
+import os
+import sys
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'epsc2024'))
+from store import convert, open_store
+from runs import load_run
+from field import LogField
+from lod import FieldLOD
+from sphere import EqualAreaGrid, levels, log_extent, log_radius
+from figures import PLOT_TYPES, angular_figure, field_figure, mixing_components_figure, phase_function_figure
+
+from synthetic import generated, write_pbz2
+from stages import Stages
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the stages of the EPSC 2024 apps on one .pbz2 file')
+    parser.add_argument('path', nargs='?', help='.pbz2 file, a synthetic one is generated if not given')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'conferences-benchmarks'))
+    parser.add_argument('--wavelengths', type=int, default=16)
+    parser.add_argument('--angles', type=int, default=181)
+    parser.add_argument('--samples', type=int, default=4000)
+    parser.add_argument('--field-points', type=int, default=20000)
+    parser.add_argument('--particles', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='Print the timings as JSON')
+    args = parser.parse_args()
+
+    path = args.path or generated(args.data_dir, 'synthetic.pbz2', write_pbz2,
+                                  wavelengths=args.wavelengths, angles=args.angles, samples=args.samples,
+                                  field_points=args.field_points, particles=args.particles)
+    stages = Stages(args.repeat)
+
+    stages.time('load: convert', lambda: convert(path))
+    data = open_store(path)
+    run = stages.time('load: run', lambda: {
+        name: np.array(value) for name, value in load_run(open_store(path)).items()})
+
+    scattered_field = data['field/scattered_field']
+    field = stages.time('field: magnitude', lambda: LogField(scattered_field))
+    sampling_points = np.array(data['field/sampling_points']) * 1e-3
+    lod = stages.time('field: levels', lambda: FieldLOD(sampling_points, field.values))
+
+    stages.time('figure: mixing components', lambda: mixing_components_figure(
+        run['wavelengths'], run['scattering_cross_section'], run['extinction_cross_section'],
+        run['single_scattering_albedo']).to_json())
+    stages.time('figure: angular', lambda: angular_figure(
+        run['scattering_angles'], run['wavelengths'], run['phase_function'], 'Phase Function').to_json())
+    stages.time('figure: field', lambda: field_figure(
+        *lod.level(len(lod) - 1, 0), field.min, field.max, (field.tick_vals_log, field.tick_vals)).to_json())
+
+    polar_angles = data['angle/data/polar_angles']
+    azimuthal_angles = data['angle/data/azimuthal_angles']
+    three_d = np.array(data['angle/data/phase_function/spatial'])
+    absolute = PLOT_TYPES['Phase Function']['absolute']
+    grid = stages.time('figure: sphere grid', lambda: EqualAreaGrid(
+        levels(polar_angles.size)[-1], polar_angles, azimuthal_angles))
+    stages.time('figure: 3D phase function', lambda: phase_function_figure(
+        *grid.surface(log_radius(three_d[:, 0], absolute)),
+        log_extent(three_d, absolute, polar_angles, azimuthal_angles), 'Phase Function').to_json())
+    stages.report(args.json)
@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'epsc2024'))
+from lod import FieldLOD
+from figures import field_figure
+
+
+def synthetic_field(n, wavelengths, rng):
+    # Dense regular sampling grid with a field decaying away from a few scatterers
+    axis = np.linspace(-5, 5, n)
+    points = np.stack([x.ravel() for x in np.meshgrid(axis, axis, axis, indexing='ij')], axis=1)
+    centers = rng.normal(scale=2, size=(8, 3))
+    distance = np.min(np.linalg.norm(points[:, np.newaxis] - centers, axis=2), axis=1)
+    values = np.log(np.exp(-distance)[np.newaxis] * rng.uniform(0.5, 2, size=(wavelengths, 1)) + np.finfo(float).eps)
+    return points, values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Payload size and time to first render of each field LOD level')
+    parser.add_argument('--grid', type=int, default=64, help='Sampling points per axis')
+    parser.add_argument('--wavelengths', type=int, default=8)
+    parser.add_argument('--budget', type=int, default=32768, help='Point budget of the finest level')
+    args = parser.parse_args()
+
+    points, values = synthetic_field(args.grid, args.wavelengths, np.random.default_rng(0))
+    vmin, vmax = values.min(), values.max()
+
+    start = time.perf_counter()
+    lod = FieldLOD(points, values, args.budget)
+    print(f'{len(points):,} sampling points, {len(lod)} levels built in {time.perf_counter() - start:.3f} s')
+
+    # Time to first render is measured up to the serialized figure, as shipped to the browser,
+    # after one warm-up build for plotly's own imports
+    field_figure(*lod.level(0, 0), vmin, vmax).to_json()
+    print(f'{"level":>5} {"points":>10} {"payload":>12} {"time":>9}')
+    for level in range(len(lod)):
+        start = time.perf_counter()
+        payload = field_figure(*lod.level(level, 0), vmin, vmax).to_json()
+        print(f'{level:>5} {lod.size(level):>10,} {len(payload) / 1024:>9.0f} KB {time.perf_counter() - start:>7.3f} s')
+    start = time.perf_counter()
+    payload = field_figure(points, values[0], vmin, vmax).to_json()
+    print(f'{"full":>5} {len(points):>10,} {len(payload) / 1024:>9.0f} KB {time.perf_counter() - start:>7.3f} s')
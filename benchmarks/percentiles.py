@@ -0,0 +1,55 @@
+import os
+import sys
+import time
+import argparse
+import warnings
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'epsc2023'))
+from normalize import nanpercentiles
+
+
+def per_array(cube, q):
+    # What the app used to do: one np.nanpercentile call per plane and percentile
+    return np.array([[np.nanpercentile(plane, x) for x in q] for plane in cube])
+
+
+def best_of(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched percentiles vs. per-array np.nanpercentile calls')
+    parser.add_argument('--planes', type=int, default=16, help='Wavelength planes per cube')
+    parser.add_argument('--rows', type=int, default=1024)
+    parser.add_argument('--cols', type=int, default=1024)
+    parser.add_argument('--products', type=int, default=6, help='Number of cubes to normalize')
+    parser.add_argument('--nan-fraction', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    q = [1, 95, 99]
+    rng = np.random.default_rng(0)
+    cubes = []
+    for _ in range(args.products):
+        cube = rng.normal(size=(args.planes, args.rows, args.cols)).astype(np.float32)
+        cube[rng.random(cube.shape) < args.nan_fraction] = np.nan
+        cubes.append(cube)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        baseline, expected = best_of(lambda: [per_array(cube, q) for cube in cubes], args.repeat)
+        batched, result = best_of(lambda: [nanpercentiles(cube, q) for cube in cubes], args.repeat)
+
+    for a, b in zip(expected, result):
+        np.testing.assert_allclose(a, b, rtol=1e-6)
+    print(f'{args.products} cubes of {args.planes}x{args.rows}x{args.cols}, percentiles {q}')
+    print(f'per-array np.nanpercentile: {baseline:8.3f} s')
+    print(f'batched nanpercentiles:     {batched:8.3f} s')
+    print(f'speedup:                    {baseline / batched:8.1f}x')
@@ -0,0 +1,128 @@
+import os
+import sys
+import glob
+import json
+import platform
+import argparse
+import datetime
+import tempfile
+import subprocess
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(HERE, 'results')
+SCRIPTS = {'epsc2023': 'epsc2023_stages.py', 'epsc2024': 'epsc2024_stages.py'}
+# Arguments of each stage script per size preset, 'medium' uses their defaults
+SIZES = {
+    'small': {
+        'epsc2023': ['--wavelengths', '4', '--rows', '128', '--cols', '128'],
+        'epsc2024': ['--wavelengths', '4', '--samples', '1000', '--field-points', '2000', '--particles', '200'],
+    },
+    'medium': {'epsc2023': [], 'epsc2024': []},
+    'large': {
+        'epsc2023': ['--wavelengths', '16', '--rows', '2048', '--cols', '2048'],
+        'epsc2024': ['--wavelengths', '64', '--angles', '1801', '--samples', '20000', '--field-points', '100000',
+                     '--particles', '20000'],
+    },
+}
+
+
+def git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_stages(app, size, repeat, data_dir):
+    '''Stage timings of one app, run in its own process since both apps have a `figures` module.'''
+    command = [sys.executable, os.path.join(HERE, SCRIPTS[app]), '--json', '--repeat', str(repeat),
+               '--data-dir', os.path.join(data_dir, size), *SIZES[size][app]]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def latest(size, exclude=None):
+    '''Most recent saved result of the `size` preset, None if there is none.'''
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, '*.json')), reverse=True):
+        if path == exclude:
+            continue
+        with open(path) as f:
+            result = json.load(f)
+        if result['size'] == size:
+            return path, result
+    return None
+
+
+def compare(baseline, result, threshold):
+    '''Print both timings of every stage, returns the stages slower by more than `threshold`.'''
+    regressions = []
+    print(f'{"stage":<40} {"baseline":>10} {"current":>10} {"ratio":>7}')
+    for app, stages in result['stages'].items():
+        for stage, seconds in stages.items():
+            before = baseline['stages'].get(app, {}).get(stage)
+            name = f'{app} {stage}'
+            if before is None:
+                print(f'{name:<40} {"-":>10} {seconds * 1e3:>7.1f} ms')
+                continue
+            ratio = seconds / before
+            flag = ''
+            if ratio > 1 + threshold:
+                regressions.append(name)
+                flag = '  slower'
+            print(f'{name:<40} {before * 1e3:>7.1f} ms {seconds * 1e3:>7.1f} ms {ratio:>6.2f}x{flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the stages of both apps on synthetic data and keep the '
+                                                 'results per commit')
+    parser.add_argument('--size', default='medium', choices=SIZES)
+    parser.add_argument('--apps', nargs='+', default=list(SCRIPTS), choices=SCRIPTS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'conferences-benchmarks'),
+                        help='Where the synthetic files are generated and kept')
+    parser.add_argument('--baseline', help='Result file to compare with, by default the previous one of the same size')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown reported as a regression')
+    parser.add_argument('--no-save', dest='save', action='store_false')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    result = dict(
+        commit=commit,
+        dirty=bool(git('status', '--porcelain', '--untracked-files=no')),
+        date=datetime.datetime.now().isoformat(timespec='seconds'),
+        size=args.size,
+        repeat=args.repeat,
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=f'{platform.platform()} {platform.machine()}, {os.cpu_count()} CPUs',
+        stages={app: run_stages(app, args.size, args.repeat, args.data_dir) for app in args.apps},
+    )
+
+    path = None
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f'{result["date"].replace(":", "")}_{commit}_{args.size}.json')
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'Saved {path}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = (args.baseline, json.load(f))
+    else:
+        baseline = latest(args.size, exclude=path)
+    if baseline is None:
+        for app, stages in result['stages'].items():
+            for stage, seconds in stages.items():
+                print(f'{app} {stage:<34} {seconds * 1e3:>10.1f} ms')
+        sys.exit(0)
+
+    print(f'Compared with {baseline[1]["commit"]} ({os.path.basename(baseline[0])})')
+    regressions = compare(baseline[1], result, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} stages slower by more than {args.threshold:.0%}')
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
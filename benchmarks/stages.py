@@ -0,0 +1,28 @@
+import json
+import time
+
+
+class Stages:
+    '''Best of `repeat` run times of named stages, in seconds.'''
+
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.times = {}
+
+    def time(self, name, function):
+        '''Run `function` `repeat` times, keep the fastest and return its last result.'''
+        times = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+        self.times[name] = min(times)
+        return result
+
+    def report(self, as_json=False):
+        if as_json:
+            print(json.dumps(self.times))
+            return
+        width = max(map(len, self.times), default=0)
+        for name, seconds in self.times.items():
+            print(f'{name:<{width}} {seconds * 1e3:>10.1f} ms')
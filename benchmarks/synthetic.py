@@ -0,0 +1,134 @@
+import os
+import bz2
+import sys
+import time
+import json
+import _pickle
+import argparse
+import warnings
+
+import numpy as np
+from astropy.io import fits
+
+CUBES = ['intensity', 'reflectance', 'albedo', 'dolp', 'aolp', 'grain_size']
+IMAGES = ['reflectance_slope', 'reflectance_intercept', 'albedo_slope', 'albedo_intercept']
+ANGULAR = ['phase_function', 'degree_of_linear_polarization', 'degree_of_linear_polarization_q',
+           'degree_of_linear_polarization_u', 'degree_of_circular_polarization']
+
+
+def write_fits(path, wavelengths=8, rows=512, cols=512, invalid_fraction=0.05, seed=0):
+    '''
+    EPSC 2023 style polarimetry file with the extensions the app reads.
+
+    Zeros mark invalid pixels as in the real files: a random fraction of
+    every cube, a border and one channel without a single valid pixel.
+    '''
+    rng = np.random.default_rng(seed)
+
+    def cube():
+        data = rng.uniform(0.01, 1, (wavelengths, rows, cols)).astype('>f4')
+        data[rng.random(data.shape) < invalid_fraction] = 0
+        data[:, :rows // 20, :] = 0
+        data[wavelengths // 2] = 0
+        return data
+
+    def image():
+        return rng.uniform(0, 1, (rows, cols)).astype('>f4')
+
+    hdus = [fits.PrimaryHDU(image())]
+    for name in CUBES:
+        hdus.append(fits.ImageHDU(cube(), name=name))
+    for name in IMAGES:
+        hdus.append(fits.ImageHDU(image(), name=name))
+    hdus.append(fits.ImageHDU(rng.integers(0, 5, (rows, cols)).astype('>i2'), name='clusters'))
+    hdus.append(fits.BinTableHDU.from_columns(
+        [fits.Column(name='wavelength', format='E', array=np.linspace(0.4, 1.0, wavelengths))], name='wavelengths'))
+    with warnings.catch_warnings():
+        # The real files use HIERARCH cards for the long header keywords too
+        warnings.simplefilter('ignore', fits.verify.VerifyWarning)
+        header = hdus[1].header
+        header['latitude'], header['longitude'], header['S-T-O'] = 10.0, 20.0, 30.0
+        header['timestamp'], header['region'] = '2023-01-01 12:00:00+0000', 'mare'
+        fits.HDUList(hdus).writeto(path, overwrite=True)
+    return path
+
+
+def write_pbz2(path, wavelengths=16, angles=181, samples=4000, field_points=20000, particles=1000, seed=0):
+    '''YASF style result dictionary, pickled and bz2-compressed, with the key layout the apps read.'''
+    rng = np.random.default_rng(seed)
+    data = {
+        'particles': {
+            'position': rng.normal(size=(particles, 3)) * 10,
+            'radii': rng.uniform(0.5, 2, particles),
+        },
+        'wavelength': {
+            'value': np.linspace(400, 1600, wavelengths),
+            'data': {
+                'scattering_cross_section': rng.uniform(1e-12, 2e-12, wavelengths),
+                'extinction_cross_section': rng.uniform(2e-12, 3e-12, wavelengths),
+                'single_scattering_albedo': rng.uniform(0.5, 1, wavelengths),
+            },
+        },
+        'field': {
+            'sampling_points': rng.uniform(-5e3, 5e3, (field_points, 3)),
+            'scattered_field': rng.normal(size=(wavelengths, field_points, 3))
+            + 1j * rng.normal(size=(wavelengths, field_points, 3)),
+        },
+        'angle': {
+            'value': np.linspace(0, np.pi, angles),
+            'data': {
+                'polar_angles': np.arccos(rng.uniform(-1, 1, samples)),
+                'azimuthal_angles': rng.uniform(0, 2 * np.pi, samples),
+            },
+        },
+    }
+    for name in ANGULAR:
+        data['angle']['data'][name] = {
+            'normal': rng.uniform(0.01, 1, (angles, wavelengths)),
+            'spatial': rng.uniform(0.01, 1, (samples, wavelengths)),
+        }
+    with bz2.BZ2File(path, 'wb') as f:
+        _pickle.dump(data, f)
+    return path
+
+
+def generated(directory, name, write, **sizes):
+    '''
+    Path of a file made by `write(path, **sizes)`, reused while the sizes are the same.
+
+    Generating the larger files takes longer than benchmarking them, so
+    they are kept in `directory` next to a record of their sizes.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    record = path + '.json'
+    try:
+        with open(record) as f:
+            if json.load(f) == sizes and os.path.exists(path):
+                return path
+    except (OSError, ValueError):
+        pass
+    start = time.perf_counter()
+    write(path, **sizes)
+    with open(record, 'w') as f:
+        json.dump(sizes, f)
+    print(f'Generated {path} in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write synthetic EPSC 2023 FITS or EPSC 2024 .pbz2 files')
+    parser.add_argument('kind', choices=['fits', 'pbz2'])
+    parser.add_argument('path')
+    parser.add_argument('--wavelengths', type=int)
+    parser.add_argument('--rows', type=int, help='fits only')
+    parser.add_argument('--cols', type=int, help='fits only')
+    parser.add_argument('--angles', type=int, help='pbz2 only')
+    parser.add_argument('--samples', type=int, help='pbz2 only, directions of the 3D phase function')
+    parser.add_argument('--field-points', type=int, help='pbz2 only')
+    parser.add_argument('--particles', type=int, help='pbz2 only')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = {key: value for key, value in vars(args).items() if key not in ('kind', 'path') and value is not None}
+    (write_fits if args.kind == 'fits' else write_pbz2)(args.path, **sizes)
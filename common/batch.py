@@ -0,0 +1,69 @@
+import os
+import multiprocessing
+from importlib.util import find_spec
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Output formats by file extension, all but html and json are rendered by kaleido
+FORMATS = ["png", "svg", "pdf", "html", "json"]
+
+
+def outdated(output, sources):
+    """Whether `output` is missing or older than any of the `sources` files."""
+    try:
+        mtime = os.path.getmtime(output)
+    except OSError:
+        return True
+    return any(os.path.getmtime(source) > mtime for source in sources)
+
+
+def format_error(fmt):
+    """Why figures can't be written as `fmt` here, None if they can."""
+    if fmt in ("html", "json") or find_spec("kaleido") is not None:
+        return None
+    return f"{fmt} export needs kaleido (pip install kaleido), html and json do not"
+
+
+def write_figure(fig, path, scale=2):
+    """Write `fig` to `path` in the format of its extension.
+
+    The file is written next to `path` first and renamed into place, so an
+    interrupted export never leaves a truncated figure that looks up to date.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    base, extension = os.path.splitext(path)
+    tmp = f"{base}.{os.getpid()}.tmp{extension}"
+    if extension == ".html":
+        fig.write_html(tmp, include_plotlyjs="cdn")
+    elif extension == ".json":
+        fig.write_json(tmp)
+    else:
+        fig.write_image(tmp, scale=scale)
+    os.replace(tmp, path)
+    return path
+
+
+def run(tasks, processes=None, progress=None):
+    """Run `tasks`, (function, args) pairs, in a pool of spawned processes.
+
+    `function` has to be importable by the workers, i.e. defined at module
+    level. `progress(done, total, task, error)` is called after each task,
+    `error` is None on success. Returns the failed tasks with their errors.
+    """
+    if not tasks:
+        return []
+    failed = []
+    with ProcessPoolExecutor(
+        max_workers=processes or os.cpu_count(),
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as executor:
+        futures = {
+            executor.submit(function, *args): (function, args)
+            for function, args in tasks
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            error = future.exception()
+            if error is not None:
+                failed.append((futures[future], error))
+            if progress is not None:
+                progress(done, len(tasks), futures[future], error)
+    return failed
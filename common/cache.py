@@ -0,0 +1,148 @@
+import os
+import sys
+import mmap
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Total budget of the in-process cache, shared by every Streamlit session
+DEFAULT_MAX_BYTES = int(float(os.environ.get("CACHE_MAX_MB", 2048)) * 1024**2)
+
+
+def _is_mapped(array):
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+
+def sizeof(value, _seen=None):
+    """Approximate number of bytes `value` keeps alive.
+
+    Memory-mapped arrays only count their header, their pages belong to the
+    OS page cache and are dropped under memory pressure anyway.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, np.ndarray):
+        size = sys.getsizeof(value) if _is_mapped(value) else value.nbytes
+        if value.dtype.hasobject:
+            size += sum(sizeof(v, _seen) for v in value.ravel())
+        return size
+    if isinstance(value, (str, bytes, bytearray, int, float, complex, mmap.mmap)):
+        return sys.getsizeof(value)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sizeof(v, _seen) for v in value)
+    if hasattr(value, "__dict__"):
+        size += sizeof(vars(value), _seen)
+    return size
+
+
+def file_version(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ByteLRUCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    Entries are stored under a key together with a version (mtime, ETag,
+    ...). Asking for a key with a different version counts as a miss and
+    replaces the stale entry.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self._loading = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, version=None, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, version=None, size=None):
+        size = sizeof(value) if size is None else size
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return value
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = (version, value, size)
+            self.current_bytes += size
+        return value
+
+    def get_or_load(self, key, version, loader, size=None):
+        """Return the cached value or call `loader()` and cache its result.
+
+        Concurrent requests for the same key wait for a single load.
+        """
+        missing = object()
+        value = self.get(key, version, missing)
+        if value is not missing:
+            return value
+        with self._lock:
+            lock = self._loading.setdefault(key, threading.Lock())
+        with lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(key)
+                    return entry[1]
+            try:
+                return self.put(key, loader(), version, size)
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                entries=len(self._entries),
+                bytes=self.current_bytes,
+                max_bytes=self.max_bytes,
+            )
+
+
+# Module level, so every session of every app in this process shares it
+shared_cache = ByteLRUCache()
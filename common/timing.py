@@ -0,0 +1,16 @@
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def timed(name, timings):
+    """Record the run time of the block in seconds as `timings[name]` and log it."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+        logger.info("%s: %.1f ms", name, timings[name] * 1e3)
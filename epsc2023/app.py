@@ -1,39 +1,119 @@
+import os
+import sys
+import hashlib
 import datetime
-import requests
 
 import numpy as np
+import requests
 import streamlit as st
-from astropy.io import fits
-from bs4 import BeautifulSoup
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cache import shared_cache, file_version
+
+from downloads import MAX_AGE, DiskCache
+from fits_reader import LocalFITS, RemoteFITS, remote_validator
+from listing import DirectoryListing
+from products import clean, invalid_mask, orient, read_only
+from indexer import Stats, sidecar_path
+from pyramid import Pyramid
+from figures import grid_figure, full_window
+from panels import COLORMAPS, derive, panel_images
 
 st.set_page_config(layout='wide')
-url = 'https://web.bv.e-technik.tu-dortmund.de/conferences/2023/epsc/'
+url = os.environ.get('EPSC2023_URL', 'https://web.bv.e-technik.tu-dortmund.de/conferences/2023/epsc/')
+
+@st.cache_resource()
+def get_disk_cache():
+    return DiskCache()
+
+@st.cache_resource()
+def get_listing(url):
+    # Shares the pooled session of the download cache and survives restarts next to it
+    disk_cache = get_disk_cache()
+    cache_file = os.path.join(disk_cache.directory, f'listing-{hashlib.sha256(url.encode()).hexdigest()}.json')
+    return DirectoryListing(url, disk_cache.session, cache_file=cache_file, fallback=lambda: disk_cache.urls(url))
+
+disk_cache = get_disk_cache()
+listing = get_listing(url)
 
 @st.cache_resource()
+def known_validators():
+    return {}
+
+@st.cache_data(ttl=MAX_AGE, show_spinner=False)
+def server_validator(url):
+    # One HEAD request per file and MAX_AGE seconds, like the revalidation of downloaded files
+    return remote_validator(disk_cache.session, url)
+
 def fetch_fits_from_server(url):
-    data = fits.open(url)
-    return data
+    # Files downloaded before are read locally, others plane by plane over HTTP
+    if disk_cache.metadata(url) is not None:
+        path = disk_cache.fetch(url)
+        return shared_cache.get_or_load(('epsc2023', url), file_version(path), lambda: LocalFITS(path))
+    # A file changed on the server has a new validator and is scanned again,
+    # if the server can't be reached the last known one is kept
+    validators = known_validators()
+    try:
+        validators[url] = server_validator(url)
+    except requests.RequestException:
+        pass
+    return shared_cache.get_or_load(('epsc2023', url), ('remote', validators.get(url)),
+                                    lambda: RemoteFITS(url, disk_cache))
+
+def cached(data, key, load):
+    # Derived data is cached apart from the raw file and never modified afterwards
+    return shared_cache.get_or_load(('epsc2023', data.version, *key), data.version, load)
+
+def derived(data, kind, name, *args):
+    return cached(data, (kind, name, *args), lambda: derive(data, kind, name, *args))
+
+def wavelengths(data):
+    return cached(data, ('wavelengths',), lambda: read_only(np.array([x[0] for x in data.table('wavelengths')])))
+
+def file_stats(data, url):
+    '''
+    Statistics from the sidecar of `url`, None if there is no (matching) one.
+
+    Without a sidecar the percentiles are taken from the displayed planes, so
+    nothing reads the full cubes. Only a missing sidecar is cached, other
+    errors are tried again on the next rerun.
+    '''
+    def load():
+        try:
+            stats = Stats.load(disk_cache.fetch(sidecar_path(url)))
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            return None
+        if None in (stats.size, data.size) or stats.size == data.size:
+            return stats
+        return None
+    try:
+        return cached(data, ('stats',), load)
+    except requests.RequestException:
+        return None
+
+def derived_mask(data, stats):
+    if stats is None:
+        # Only for "full" channel data, the mask needs the albedo and dolp cubes
+        return cached(data, ('mask',), lambda: read_only(orient(invalid_mask(clean(data.cube('albedo')),
+                                                                              clean(data.cube('dolp'))))))
+    return cached(data, ('mask', 'sidecar'), lambda: read_only(orient(stats.mask())))
 
 with st.sidebar:
 
     form = st.form('options')
 
-    page = requests.get(url).text
-    soup = BeautifulSoup(page, 'html.parser')
-    files = [url + node.get('href') for node in soup.find_all('a', href=True) if node.get('href').endswith('.fits')]
-
+    files = listing.files()
     file_path = form.selectbox('Choose a polarimetry file:', sorted(files), 0, lambda x: x.split('/')[-1])
     data = fetch_fits_from_server(file_path)
-    for i in range(len(data)):
-        if (i > 0) and (data[i].header['XTENSION'] == 'BINTABLE'):
-            continue
-        data[i].data[data[i].data == 0] = 0 if isinstance(data[i].data.ravel()[0], np.integer) else np.nan
-    latitude  = data['intensity'].header['latitude']
-    longitude = data['intensity'].header['longitude']
-    phase_angle = data['intensity'].header['S-T-O']
-    timestamp = datetime.datetime.strptime(data['intensity'].header['timestamp'], '%Y-%m-%d %H:%M:%S%z')
-
-    wavelenghts_pol = np.array([x[0] for x in data['wavelengths'].data])
+    header = data.header('intensity')
+    latitude  = header['latitude']
+    longitude = header['longitude']
+    phase_angle = header['S-T-O']
+    timestamp = datetime.datetime.strptime(header['timestamp'], '%Y-%m-%d %H:%M:%S%z')
+
+    wavelenghts_pol = wavelengths(data)
     wavelenghts_pol_select = form.selectbox('Select wavelength', wavelenghts_pol, wavelenghts_pol.size-1, lambda x: f'{x:.2f} μm')
     wavelenghts_pol_idx = np.where(wavelenghts_pol == wavelenghts_pol_select)[0][0]
 
@@ -41,124 +121,50 @@ with st.sidebar:
     mask_slope = form.checkbox('Display only "full" channel data', True, help='Global invalid channels are filtered for first')
     # ref_or_alb = form.selectbox('Reflectance or Albedo?', ['reflectance', 'albedo'], 0, lambda x: x.title())
     ref_or_alb = 'reflectance'
+    stats = file_stats(data, file_path) if percentile or mask_slope else None
 
     submitted = form.form_submit_button('Submit Changes')
 
+    with st.expander('Cache'):
+        st.json(shared_cache.stats())
+        st.caption(f'Download cache: {disk_cache.size() / 1024**2:.1f} MB in {disk_cache.directory}')
+        age = 'never fetched' if listing.age is None else f'{listing.age:.0f} s old'
+        st.caption(f'File list: {age}' + (f' (server unreachable: {listing.error})' if listing.error else ''))
+
 
 st.write('Date:', timestamp.date(), ' - Time:', timestamp.time(), ' - Time zone:', timestamp.tzinfo)
 st.write('Latitude:', latitude, ' - Longitude:', longitude)
 st.write('Phase angle:', phase_angle, '°')
-st.write('Region: ', data['intensity'].header['region'].title())
-
-wac         = data['primary'].data
-intensity   = data['intensity'].data[wavelenghts_pol_idx, :, :]
-comparisson = data['albedo'].data[wavelenghts_pol_idx, :, :] if (ref_or_alb == 'albedo') else data['reflectance'].data[wavelenghts_pol_idx, :, :]
-dolp        = data['dolp'].data[wavelenghts_pol_idx, :, :]
-aolp        = data['aolp'].data[wavelenghts_pol_idx, :, :]
-slope       = data['albedo_slope'].data                      if (ref_or_alb == 'albedo') else data['reflectance_slope'].data
-intercept   = data['albedo_intercept'].data                  if (ref_or_alb == 'albedo') else data['reflectance_intercept'].data
-clusters    = data['clusters'].data
-grain_size  = data['grain_size'].data[wavelenghts_pol_idx, :, :]
-
-if mask_slope:
-    # Determine the number of invalid channels for each pixel
-    mask = np.maximum(np.sum(np.isnan(data['albedo'].data), axis=0), np.sum(np.isnan(data['dolp'].data), axis=0))
-    # If the number of invalid channels is greater than the number of global invalid channels, then the pixel is set to nan
-    mask = mask > np.sum(np.all(np.isnan(data['albedo'].data), axis=(1,2)) | np.all(np.isnan(data['dolp'].data), axis=(1,2)))
-    slope[mask]     = np.nan
-    intercept[mask] = np.nan
-
-
-if percentile:
-
-    comparisson = np.clip(
-        comparisson,
-        np.nanpercentile(comparisson, 1),
-        np.nanpercentile(comparisson, 99),
-    )
-    dolp = np.clip(
-        dolp,
-        np.nanpercentile(dolp, 1),
-        np.nanpercentile(dolp, 99),
-    )
-    aolp = np.clip(
-        aolp,
-        np.nanpercentile(aolp, 1),
-        np.nanpercentile(aolp, 99),
-    )
-    slope = np.clip(
-        slope,
-        np.nanpercentile(slope, 1),
-        np.nanpercentile(slope, 95),
-    )
-    intercept = np.clip(
-        intercept,
-        np.nanpercentile(intercept, 1),
-        np.nanpercentile(intercept, 99),
-    )
-
-    grain_size = np.clip(
-        grain_size,
-        np.nanpercentile(grain_size, 1),
-        np.nanpercentile(grain_size, 99),
-    )
-
-    # dolp[dolp < np.nanpercentile(dolp, 1)]  = np.nan
-    # dolp[dolp > np.nanpercentile(dolp, 99)] = np.nan
-    # aolp[aolp < np.nanpercentile(aolp, 1)]  = np.nan
-    # aolp[aolp > np.nanpercentile(aolp, 99)] = np.nan
-
-    # slope[slope < np.nanpercentile(slope, 1)]  = np.nan
-    # slope[slope > np.nanpercentile(slope, 99)] = np.nan
-
-wac         = np.rot90(wac,         2)
-intensity   = np.rot90(intensity,   2)
-comparisson = np.rot90(comparisson, 2)
-dolp        = np.rot90(dolp,        2)
-aolp        = np.rot90(aolp,        2)
-slope       = np.rot90(slope,       2)
-intercept   = np.rot90(intercept,   2)
-clusters    = np.rot90(clusters,    2)
-grain_size  = np.rot90(grain_size,  2)
-
-intensity = intensity.astype(float)
-intensity[intensity < 1e-12] = np.nan
-
-import matplotlib.pyplot as plt
-import mpld3
-import streamlit.components.v1 as components
-rows = 3
-cols = 3
-fig, axs = plt.subplots(nrows=rows, ncols=cols, sharex=True, sharey=True)
-fig.set_figheight(10)
-fig.set_figwidth(10)
-axs[0,0].imshow(wac, cmap='gray')
-axs[0,0].set_title('WAC')
-axs[0,1].imshow(intensity, cmap='jet')
-axs[0,1].set_title('Intensity')
-axs[0,2].imshow(comparisson, cmap='jet')
-axs[0,2].set_title(ref_or_alb.title())
-
-axs[1,0].imshow(clusters, cmap='jet')
-axs[1,0].set_title('SOM')
-axs[1,1].imshow(dolp, cmap='jet')
-axs[1,1].set_title('DoLP')
-axs[1,2].imshow(slope, cmap='jet')
-axs[1,2].set_title('Slope')
-
-axs[2,0].imshow(grain_size, cmap='jet')
-axs[2,0].set_title('Rel. Grain Size')
-axs[2,1].imshow(aolp, cmap='jet')
-axs[2,1].set_title('AoLP')
-axs[2,2].imshow(intercept, cmap='jet')
-axs[2,2].set_title('Intercept')
-
-for i in range(rows):
-    for j in range(cols):
-        axs[i,j].set_xticks([])
-        axs[i,j].set_yticks([])
-
-plt.tight_layout()
-fig_html = mpld3.fig_to_html(fig)
-components.html(fig_html, height=1050, scrolling=True)
-st.info(':arrow_up: **Note:** hover to the bottom left corner for zoom and pan tools.')
\ No newline at end of file
+st.write('Region: ', header['region'].title())
+
+panels = panel_images(data, stats, wavelenghts_pol_idx, percentile, mask_slope, ref_or_alb, derived,
+                      derived_mask(data, stats) if mask_slope else None)
+wac = panels[0][2]
+
+# Each panel is an image pyramid, only the tiles resolving the current window are sent
+pyramid_keys = {}
+for i, (title, name, image) in enumerate(panels):
+    key = ('pyramid', name, wavelenghts_pol_idx, percentile, mask_slope)
+    pyramid = cached(data, key, lambda: Pyramid(image, COLORMAPS.get(name, 'jet')))
+    pyramid_keys[id(pyramid)] = key
+    panels[i] = (title, pyramid)
+
+def tile(pyramid, level, row, col):
+    return cached(data, (*pyramid_keys[id(pyramid)], level, row, col), lambda: pyramid.tile_png(level, row, col))
+
+# Box selections zoom in with finer tiles, the window is kept per file
+view = st.session_state.setdefault('view', {})
+if view.get('file') != file_path:
+    view.update(file=file_path, window=full_window(wac.shape))
+event = st.session_state.get('grid')
+box = event.selection.box if event is not None and event.selection.box else None
+if box and box != view.get('box') and box[0].get('x') and box[0].get('y'):
+    view['box'] = box
+    x, y = sorted(box[0]['x']), sorted(box[0]['y'])
+    view['window'] = (max(x[0] + 0.5, 0), min(x[1] + 0.5, wac.shape[1]), max(y[0] + 0.5, 0), min(y[1] + 0.5, wac.shape[0]))
+if st.button('Reset zoom'):
+    view['window'] = full_window(wac.shape)
+
+fig = grid_figure(panels, view['window'], tile=tile)
+st.plotly_chart(fig, key='grid', on_select='rerun', selection_mode='box', config=dict(displaylogo=False))
+st.info(':arrow_up: **Note:** zoom and pan with the toolbar in the top right corner, box select a region to load it at full resolution.')
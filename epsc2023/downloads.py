@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CACHE_DIR = os.environ.get('EPSC2023_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'epsc2023'))
+CACHE_MAX_BYTES = int(float(os.environ.get('EPSC2023_CACHE_MAX_MB', 4096)) * 1024**2)
+# Seconds a cached file is trusted before it is revalidated with the server
+MAX_AGE = 60
+CHUNK_SIZE = 1024**2
+# Connections kept alive per host, shared by every session of the app
+POOL_SIZE = 16
+
+
+def make_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=POOL_SIZE)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _write_atomic(path, write):
+    fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+class DiskCache:
+    '''
+    Local copies of remote files, revalidated with ETag / Last-Modified.
+
+    Every file is stored under the hash of its URL next to a small JSON file
+    with the validators. The mtime of that JSON file marks the last use and
+    drives the LRU cleanup once the directory grows beyond `max_bytes`.
+    '''
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=MAX_AGE, session=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.session = make_session() if session is None else session
+        self._locks = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        base = os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest())
+        return base + '.data', base + '.json'
+
+    def metadata(self, url):
+        path, meta_path = self._paths(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_metadata(self, url, meta):
+        _write_atomic(self._paths(url)[1], lambda f: f.write(json.dumps(meta).encode()))
+
+    def urls(self, prefix=''):
+        '''URLs of all cached files starting with `prefix`.'''
+        urls = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    url = json.load(f)['url']
+            except (OSError, ValueError, KeyError):
+                continue
+            if url.startswith(prefix) and self.metadata(url) is not None:
+                urls.append(url)
+        return urls
+
+    def fetch(self, url):
+        '''Path of an up-to-date local copy of `url`.
+
+        A 304 answer only refreshes the validators. If the server can't be
+        reached, the cached copy is used as is.
+        '''
+        with self._lock:
+            lock = self._locks.setdefault(url, threading.Lock())
+        with lock:
+            path, meta_path = self._paths(url)
+            meta = self.metadata(url)
+            if meta is not None and time.time() - meta['checked'] < self.max_age:
+                os.utime(meta_path)
+                return path
+
+            headers = {}
+            if meta is not None and meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta is not None and meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+            try:
+                response = self.session.get(url, headers=headers, stream=True, timeout=30)
+                if meta is None or response.status_code != 304:
+                    response.raise_for_status()
+            except requests.RequestException:
+                if meta is None:
+                    raise
+                # Offline or server trouble: keep working with what we have
+                os.utime(meta_path)
+                return path
+
+            def download(f):
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+
+            with response:
+                if response.status_code != 304:
+                    _write_atomic(path, download)
+                    meta = dict(
+                        url=url,
+                        etag=response.headers.get('ETag'),
+                        last_modified=response.headers.get('Last-Modified'),
+                        size=os.path.getsize(path),
+                    )
+            meta['checked'] = time.time()
+            self._save_metadata(url, meta)
+
+        self.cleanup(keep=path)
+        return path
+
+    def size(self):
+        total = 0
+        for name in os.listdir(self.directory):
+            try:
+                total += os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                # Removed by a cleanup or replaced by a download of another session
+                continue
+        return total
+
+    def cleanup(self, keep=None):
+        '''Remove least recently used files until the cache fits `max_bytes`.'''
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.data'):
+                continue
+            path = os.path.join(self.directory, name)
+            meta_path = path[:-len('.data')] + '.json'
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                # Removed by a concurrent cleanup
+                continue
+            try:
+                used = os.path.getmtime(meta_path)
+            except OSError:
+                used = 0
+            entries.append((used, size, path, meta_path))
+
+        total = sum(entry[1] for entry in entries)
+        for used, size, path, meta_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            for file in (meta_path, path):
+                try:
+                    os.remove(file)
+                except OSError:
+                    pass
+            total -= size
@@ -0,0 +1,104 @@
+import os
+import sys
+import glob
+import argparse
+
+import numpy as np
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batch import FORMATS, format_error, outdated, run, write_figure
+
+from downloads import DiskCache
+from fits_reader import LocalFITS
+from listing import DirectoryListing
+from indexer import Stats, compute_stats, save_stats, sidecar_path
+from pyramid import Pyramid
+from panels import COLORMAPS, panel_images
+from figures import grid_figure
+
+OUTPUT_DIR = 'figures/epsc2023'
+
+
+def index(path, sidecar):
+    save_stats(sidecar, compute_stats(LocalFITS(path)))
+
+
+def render(name, path, sidecar, index, output, percentile=True, mask_slope=True, scale=1):
+    '''Nine-panel grid of wavelength plane `index` of the file `name` at full resolution, as in app.py.'''
+    data = LocalFITS(path)
+    panels = panel_images(data, Stats.load(sidecar), index, percentile, mask_slope)
+    shape = panels[0][2].shape
+    fig = grid_figure([(title, Pyramid(image, COLORMAPS.get(product, 'jet'))) for title, product, image in panels],
+                      viewport=max(shape))
+    wavelength = np.array([x[0] for x in data.table('wavelengths')])[index]
+    fig.update_layout(title=f'{name} - {wavelength:.2f} μm', margin=dict(t=60))
+    return write_figure(fig, output, scale)
+
+
+def local_files(paths):
+    files = []
+    for path in paths:
+        files += sorted(glob.glob(os.path.join(path, '*.fits'))) if os.path.isdir(path) else [path]
+    return [(os.path.basename(file), file, sidecar_path(file)) for file in files]
+
+
+def remote_files(url):
+    # Files and sidecars go through the download cache the app uses, so they are fetched once
+    disk_cache = DiskCache()
+    files = []
+    for file_url in sorted(DirectoryListing(url, disk_cache.session).files()):
+        print(f'Fetching {file_url}')
+        path = disk_cache.fetch(file_url)
+        try:
+            sidecar = disk_cache.fetch(sidecar_path(file_url))
+        except requests.RequestException:
+            sidecar = sidecar_path(path)
+        files.append((file_url.split('/')[-1], path, sidecar))
+    return files
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render the polarimetry grid of every file and wavelength without Streamlit')
+    parser.add_argument('paths', nargs='*', help='FITS files or directories containing them')
+    parser.add_argument('--url', help='Export the files listed at this URL instead, e.g. the EPSC2023_URL of the app')
+    parser.add_argument('-o', '--output', default=OUTPUT_DIR)
+    parser.add_argument('-f', '--format', default='png', choices=FORMATS, help='png, svg and pdf need kaleido')
+    parser.add_argument('--no-percentile', dest='percentile', action='store_false', help='Do not clip to the percentiles')
+    parser.add_argument('--no-mask', dest='mask_slope', action='store_false', help='Do not mask pixels with invalid channels')
+    parser.add_argument('--scale', type=float, default=1, help='Pixel density of raster images')
+    parser.add_argument('-j', '--processes', type=int, default=None)
+    parser.add_argument('--force', action='store_true', help='Render up-to-date figures too')
+    args = parser.parse_args()
+    if not args.paths and not args.url:
+        parser.error('give FITS paths or --url')
+    # Fail before anything is downloaded or indexed
+    if error := format_error(args.format):
+        parser.error(error)
+
+    files = remote_files(args.url) if args.url else local_files(args.paths)
+
+    def report(done, total, task, error):
+        function, arguments = task
+        target = f'Indexed {arguments[0]}' if function is index else arguments[4]
+        print(f'[{done}/{total}] {target}' + (f' failed: {error}' if error else ''))
+
+    # Files without an up-to-date sidecar are indexed first, once per file
+    failed = run([(index, (path, sidecar)) for _, path, sidecar in files if outdated(sidecar, [path])],
+                 args.processes, report)
+
+    todo, skipped = [], 0
+    for name, path, sidecar in files:
+        if not os.path.exists(sidecar):
+            continue
+        wavelengths = LocalFITS(path).table('wavelengths')
+        for i, (wavelength, *_) in enumerate(wavelengths):
+            output = os.path.join(args.output, os.path.splitext(name)[0], f'{i:02d}_{wavelength:.2f}um.{args.format}')
+            if args.force or outdated(output, [path, sidecar]):
+                todo.append((render, (name, path, sidecar, i, output, args.percentile, args.mask_slope, args.scale)))
+            else:
+                skipped += 1
+
+    print(f'{len(todo)} figures to render, {skipped} up to date')
+    failed += run(todo, args.processes, report)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,43 @@
+import base64
+
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+# Screen pixels a panel is rendered with, tiles are picked to match
+VIEWPORT = 400
+
+
+def full_window(shape):
+    '''Window (x0, x1, y0, y1) showing a whole image of `shape`.'''
+    return (0, shape[1], 0, shape[0])
+
+
+def grid_figure(panels, window=None, viewport=VIEWPORT, tile=None, rows=3, cols=3, height=1050):
+    '''
+    Grid of image panels with shared axes, built from pyramid tiles.
+
+    `panels` is a list of (title, Pyramid). Each panel only gets the tiles of
+    the level that resolves `window` (full resolution pixels, the whole image
+    if None) on `viewport` screen pixels, so the figure size does not depend
+    on the image resolution. `tile(pyramid, level, row, col)` returns the PNG
+    of a tile and allows caching them, by default they are encoded here.
+    '''
+    tile = tile or (lambda pyramid, level, row, col: pyramid.tile_png(level, row, col))
+    window = window or full_window(panels[0][1].shape)
+    x0, x1, y0, y1 = window
+
+    fig = make_subplots(rows=rows, cols=cols, shared_xaxes='all', shared_yaxes='all',
+                        subplot_titles=[title for title, _ in panels],
+                        horizontal_spacing=0.01, vertical_spacing=0.03)
+    for i, (_, pyramid) in enumerate(panels):
+        level = pyramid.level_for(max(x1 - x0, y1 - y0), viewport)
+        for (row, col), (x, y, scale) in pyramid.tiles(level, window):
+            source = 'data:image/png;base64,' + base64.b64encode(tile(pyramid, level, row, col)).decode()
+            fig.add_trace(go.Image(source=source, x0=x, y0=y, dx=scale, dy=scale, hoverinfo='skip'),
+                          row=i // cols + 1, col=i % cols + 1)
+
+    fig.update_xaxes(range=[x0 - 0.5, x1 - 0.5], showticklabels=False, showgrid=False, zeroline=False)
+    fig.update_yaxes(range=[y1 - 0.5, y0 - 0.5], showticklabels=False, showgrid=False, zeroline=False,
+                     scaleanchor='x', constrain='domain')
+    fig.update_layout(height=height, margin=dict(l=0, r=0, t=30, b=0), dragmode='zoom')
+    return fig
@@ -0,0 +1,188 @@
+import os
+
+import numpy as np
+from astropy.io import fits
+
+BLOCK_SIZE = 2880
+CARD_SIZE = 80
+END_CARD = b'END' + b' ' * (CARD_SIZE - 3)
+# Bytes requested at once while looking for the end of a header
+HEADER_CHUNK = 4 * BLOCK_SIZE
+DTYPES = {8: 'u1', 16: '>i2', 32: '>i4', 64: '>i8', -32: '>f4', -64: '>f8'}
+
+
+class RangesUnsupported(Exception):
+    '''The server ignored a range request, or the file changed since it was scanned.'''
+
+
+def validator(response):
+    '''ETag or Last-Modified of a response, what RemoteFITS sends as If-Range.'''
+    return response.headers.get('ETag') or response.headers.get('Last-Modified')
+
+
+def remote_validator(session, url):
+    '''Validator of the file at `url` as the server currently has it, from a HEAD request.'''
+    response = session.head(url, allow_redirects=True, timeout=30)
+    response.raise_for_status()
+    return validator(response)
+
+
+def _padded(size):
+    return -(-size // BLOCK_SIZE) * BLOCK_SIZE
+
+
+def _find_end(raw):
+    for i in range(0, len(raw) - CARD_SIZE + 1, CARD_SIZE):
+        if raw[i:i + CARD_SIZE] == END_CARD:
+            return i + CARD_SIZE
+    return None
+
+
+def _data_size(header):
+    if header['NAXIS'] == 0:
+        return 0
+    elements = np.prod([header[f'NAXIS{i + 1}'] for i in range(header['NAXIS'])], dtype=np.int64)
+    return abs(header['BITPIX']) // 8 * header.get('GCOUNT', 1) * (header.get('PCOUNT', 0) + int(elements))
+
+
+def _shape(header):
+    return tuple(header[f'NAXIS{i}'] for i in range(header['NAXIS'], 0, -1))
+
+
+def _decode(raw, header, shape):
+    data = np.frombuffer(raw, dtype=DTYPES[header['BITPIX']]).reshape(shape)
+    bscale = header.get('BSCALE', 1)
+    bzero = header.get('BZERO', 0)
+    if (bscale, bzero) != (1, 0):
+        return data * bscale + bzero
+    return data.astype(data.dtype.newbyteorder('='))
+
+
+class LocalFITS:
+    '''Reader for a FITS file on disk, only touching the requested planes.'''
+
+    def __init__(self, path):
+        self.path = path
+        self.hdul = fits.open(path, memmap=True)
+        stat = os.stat(path)
+        self.size = stat.st_size
+        self.version = (path, stat.st_mtime_ns, stat.st_size)
+
+    def header(self, name):
+        return self.hdul[name].header
+
+    def table(self, name):
+        return self.hdul[name].data
+
+    def image(self, name):
+        return np.array(self.hdul[name].data)
+
+    def plane(self, name, index):
+        return np.array(self.hdul[name].section[index])
+
+    def cube(self, name):
+        return np.array(self.hdul[name].data)
+
+
+class RemoteFITS:
+    '''
+    Reader for a FITS file on a web server using HTTP range requests.
+
+    On creation only the headers are fetched, block by block, to learn where
+    the data of every extension starts. Planes of a cube are contiguous, so a
+    single range request reads one wavelength. If the server doesn't honour
+    ranges, the whole file is fetched into `disk_cache` and read from there.
+    '''
+
+    def __init__(self, url, disk_cache):
+        self.url = url
+        self.disk_cache = disk_cache
+        self.session = disk_cache.session
+        self.size = None
+        self.validator = None
+        self.hdus = {}
+        self._local = None
+        try:
+            self._scan()
+        except RangesUnsupported:
+            self._use_local()
+
+    @property
+    def version(self):
+        # Files of the same shape have the same size, and servers may send no validator
+        return self._local.version if self._local is not None else (self.url, self.validator, self.size)
+
+    def _use_local(self):
+        self._local = LocalFITS(self.disk_cache.fetch(self.url))
+
+    def _range(self, start, stop):
+        headers = {'Range': f'bytes={start}-{stop - 1}'}
+        if self.validator is not None:
+            headers['If-Range'] = self.validator
+        # Streamed, so a 200 with the whole file is closed before its body is read
+        with self.session.get(self.url, headers=headers, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                raise RangesUnsupported(self.url)
+            if self.size is None:
+                self.size = int(response.headers['Content-Range'].split('/')[-1])
+                self.validator = validator(response)
+            return response.content
+
+    def _scan(self):
+        offset = 0
+        while self.size is None or offset < self.size:
+            raw = b''
+            while (end := _find_end(raw)) is None:
+                chunk = self._range(offset + len(raw), offset + len(raw) + HEADER_CHUNK)
+                if not chunk:
+                    raise OSError(f'Truncated FITS header in {self.url}')
+                raw += chunk
+            header = fits.Header.fromstring(raw[:end].decode('ascii'))
+            name = 'PRIMARY' if offset == 0 else header.get('EXTNAME', str(len(self.hdus))).upper()
+            data_offset = offset + _padded(end)
+            data_size = _data_size(header)
+            self.hdus[name] = dict(header=header, header_bytes=raw[:_padded(end)], offset=data_offset, size=data_size)
+            offset = data_offset + _padded(data_size)
+
+    def _read(self, method, name, *args):
+        if self._local is None:
+            try:
+                return getattr(self, '_' + method)(self.hdus[name.upper()], *args)
+            except RangesUnsupported:
+                self._use_local()
+        return getattr(self._local, method)(name, *args)
+
+    def header(self, name):
+        if self._local is not None:
+            return self._local.header(name)
+        return self.hdus[name.upper()]['header']
+
+    def table(self, name):
+        return self._read('table', name)
+
+    def image(self, name):
+        return self._read('image', name)
+
+    def plane(self, name, index):
+        return self._read('plane', name, index)
+
+    def cube(self, name):
+        return self._read('cube', name)
+
+    def _table(self, hdu):
+        raw = self._range(hdu['offset'], hdu['offset'] + _padded(hdu['size']))
+        return fits.BinTableHDU.fromstring(hdu['header_bytes'] + raw).data
+
+    def _image(self, hdu):
+        shape = _shape(hdu['header'])
+        raw = self._range(hdu['offset'], hdu['offset'] + hdu['size'])
+        return _decode(raw, hdu['header'], shape)
+
+    _cube = _image
+
+    def _plane(self, hdu, index):
+        shape = _shape(hdu['header'])[1:]
+        plane_size = abs(hdu['header']['BITPIX']) // 8 * int(np.prod(shape))
+        start = hdu['offset'] + index * plane_size
+        return _decode(self._range(start, start + plane_size), hdu['header'], shape)
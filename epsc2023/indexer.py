@@ -0,0 +1,102 @@
+import os
+import re
+import glob
+import argparse
+
+import numpy as np
+
+from fits_reader import LocalFITS
+from normalize import PercentileTable
+from products import clean, nan_count, invalid_channels, mask_from_counts
+
+PERCENTILES = [1, 95, 99]
+CUBES = ['intensity', 'reflectance', 'albedo', 'dolp', 'aolp', 'grain_size']
+IMAGES = ['reflectance_slope', 'reflectance_intercept', 'albedo_slope', 'albedo_intercept']
+
+
+def sidecar_path(path):
+    '''Sidecar of a FITS file (or URL), `cube.fits` -> `cube.stats.npz`.'''
+    return re.sub(r'\.fits$', '', path) + '.stats.npz'
+
+
+def compute_stats(data):
+    '''
+    Statistics the app needs from the full cubes of one file.
+
+    `data` is a LocalFITS or RemoteFITS reader. Percentiles are taken over
+    the cleaned data of every plane; slope and intercept images are also
+    indexed after masking, as displayed with "full" channel data only.
+    '''
+    stats = dict(q=np.array(PERCENTILES), size=np.array(data.size or -1))
+    albedo = clean(data.cube('albedo'))
+    dolp = clean(data.cube('dolp'))
+    stats['nan_count_albedo'] = nan_count(albedo).astype(np.int16)
+    stats['nan_count_dolp'] = nan_count(dolp).astype(np.int16)
+    stats['invalid_channels'] = invalid_channels(albedo) | invalid_channels(dolp)
+    mask = mask_from_counts(stats['nan_count_albedo'], stats['nan_count_dolp'], stats['invalid_channels'])
+    del albedo, dolp
+
+    # Every plane of a product is indexed in one batched pass
+    table = PercentileTable(PERCENTILES)
+    for name in CUBES:
+        table.add(name, clean(data.cube(name)))
+    for name in IMAGES:
+        image = clean(data.image(name))
+        table.add(name, image)
+        image[mask] = np.nan
+        table.add(f'{name}_masked', image)
+    for name, values in table.values.items():
+        stats[f'percentiles_{name}'] = values
+    return stats
+
+
+def save_stats(path, stats):
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **stats)
+    os.replace(tmp, path)
+
+
+class Stats:
+    '''Read-only access to the contents of a sidecar.'''
+
+    def __init__(self, stats):
+        self.stats = {key: np.asarray(value) for key, value in stats.items()}
+        for value in self.stats.values():
+            value.flags.writeable = False
+        self.percentiles = PercentileTable(self.stats['q'], {
+            key[len('percentiles_'):]: value for key, value in self.stats.items() if key.startswith('percentiles_')
+        })
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(dict(f))
+
+    @property
+    def size(self):
+        size = int(self.stats['size'])
+        return None if size < 0 else size
+
+    def mask(self):
+        return mask_from_counts(self.stats['nan_count_albedo'], self.stats['nan_count_dolp'], self.stats['invalid_channels'])
+
+    def bounds(self, name, index=None, low=1, high=99, masked=False):
+        '''Clip bounds of a product, at plane `index` for cubes.'''
+        return self.percentiles.bounds(name + ('_masked' if masked else ''), index, low, high)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a statistics sidecar next to each FITS file')
+    parser.add_argument('paths', nargs='+', help='FITS files or directories containing them')
+    parser.add_argument('--force', action='store_true', help='Index files with an up-to-date sidecar too')
+    args = parser.parse_args()
+
+    files = []
+    for path in args.paths:
+        files += sorted(glob.glob(os.path.join(path, '*.fits'))) if os.path.isdir(path) else [path]
+    for file in files:
+        sidecar = sidecar_path(file)
+        if not args.force and os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(file):
+            continue
+        print(f'Indexing {file}')
+        save_stats(sidecar, compute_stats(LocalFITS(file)))
@@ -0,0 +1,96 @@
+import os
+import json
+import time
+import threading
+
+import requests
+from bs4 import BeautifulSoup
+
+# Seconds before a listing is refreshed in the background
+TTL = 300
+# The very first request may block the page, but not for long
+TIMEOUT = 5
+
+
+def parse_listing(url, page, extension='.fits'):
+    soup = BeautifulSoup(page, 'html.parser')
+    return sorted(url + node.get('href') for node in soup.find_all('a', href=True) if node.get('href').endswith(extension))
+
+
+class DirectoryListing:
+    '''
+    Files in a web server's directory index, served stale-while-revalidate.
+
+    `files()` returns immediately with the last known listing and, once that
+    is older than `ttl`, refreshes it in a background thread. Only when no
+    listing is known at all (neither in memory nor in `cache_file`) does it
+    wait for the server, falling back to `fallback()` if that fails. The
+    fallback is kept like a listing that was never fetched, so it is served
+    right away and refreshed in the background on the next calls.
+    '''
+
+    def __init__(self, url, session, ttl=TTL, cache_file=None, fallback=None):
+        self.url = url
+        self.session = session
+        self.ttl = ttl
+        self.cache_file = cache_file
+        self.fallback = fallback
+        self.error = None
+        self._files = None
+        # None until a listing was fetched from the server
+        self._fetched = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file) as f:
+                    saved = json.load(f)
+                self._files, self._fetched = saved['files'], saved['fetched']
+            except (OSError, ValueError, KeyError):
+                pass
+
+    @property
+    def age(self):
+        '''Seconds since the listing was fetched from the server, None if it never was.'''
+        return None if self._fetched is None else time.time() - self._fetched
+
+    def _fetch(self):
+        response = self.session.get(self.url, timeout=TIMEOUT)
+        response.raise_for_status()
+        files = parse_listing(self.url, response.text)
+        with self._lock:
+            self._files, self._fetched, self.error = files, time.time(), None
+        if self.cache_file is not None:
+            tmp = f'{self.cache_file}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(dict(files=files, fetched=self._fetched), f)
+            os.replace(tmp, self.cache_file)
+        return files
+
+    def _refresh(self):
+        try:
+            self._fetch()
+        except requests.RequestException as e:
+            # Keep serving the stale listing
+            self.error = e
+        finally:
+            self._refreshing = False
+
+    def files(self):
+        if self._files is None:
+            try:
+                return self._fetch()
+            except requests.RequestException as e:
+                self.error = e
+                files = self.fallback() if self.fallback is not None else []
+                with self._lock:
+                    if self._files is None:
+                        self._files = files
+                return files
+
+        with self._lock:
+            stale = self._fetched is None or self.age > self.ttl
+            if stale and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+            return self._files
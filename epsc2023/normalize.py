@@ -0,0 +1,83 @@
+import numpy as np
+
+# numpy's vectorized sort beats np.partition as soon as it has to select
+# more than a couple of order statistics
+MAX_PARTITION_KTH = 2
+
+
+def _lerp(a, b, t):
+    # Same formulation as numpy's 'linear' percentile method, planes without
+    # valid values (inf - inf) are set to NaN by the caller
+    with np.errstate(invalid='ignore'):
+        diff = b - a
+        return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def nanpercentiles(planes, q):
+    '''
+    Percentiles `q` of each plane in `planes`, ignoring NaN and ±inf, in one pass.
+
+    `planes` has the planes along its first axis. Non-finite values are
+    counted, then moved to the end of every plane, and all order statistics
+    needed by any plane are selected with a single partition (or sort) of
+    the whole batch. Results match np.nanpercentile of the finite values
+    with the default 'linear' method and have the shape (planes, len(q)).
+    Infinite values are left out as they would make useless clip bounds.
+    '''
+    planes = np.asarray(planes)
+    dtype = planes.dtype.newbyteorder('=') if np.issubdtype(planes.dtype, np.floating) else np.float64
+    flat = np.array(planes, dtype=dtype).reshape(len(planes), -1)
+    invalid = ~np.isfinite(flat)
+    valid = flat.shape[1] - invalid.sum(axis=1)
+    flat[invalid] = np.inf
+
+    position = np.asarray(q, dtype=np.float64)[np.newaxis] / 100 * np.maximum(valid - 1, 0)[:, np.newaxis]
+    low = np.floor(position).astype(np.intp)
+    high = np.minimum(low + 1, np.maximum(valid - 1, 0)[:, np.newaxis])
+
+    kth = np.unique(np.concatenate([low.ravel(), high.ravel()]))
+    if flat.shape[1] == 0:
+        ordered = flat
+    elif kth.size <= MAX_PARTITION_KTH:
+        ordered = np.partition(flat, kth, axis=1)
+    else:
+        ordered = np.sort(flat, axis=1)
+
+    rows = np.arange(len(flat))[:, np.newaxis]
+    values = _lerp(ordered[rows, low].astype(np.float64), ordered[rows, high].astype(np.float64), position - low)
+    values[valid == 0] = np.nan
+    return values
+
+
+class PercentileTable:
+    '''
+    Percentiles of named products, looked up as clip bounds.
+
+    Products are images or cubes with the wavelength planes first, for cubes
+    every plane is indexed.
+    '''
+
+    def __init__(self, q, values=None):
+        self.q = [float(x) for x in q]
+        self.values = {} if values is None else dict(values)
+
+    def add(self, name, array):
+        array = np.asarray(array)
+        if array.ndim == 2:
+            self.values[name] = nanpercentiles(array[np.newaxis], self.q)[0]
+        else:
+            self.values[name] = nanpercentiles(array, self.q)
+        return self
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def bounds(self, name, index=None, low=1, high=99):
+        '''Lower and upper clip bound of a product, at plane `index` for cubes.'''
+        values = self.values[name]
+        if index is not None:
+            values = values[index]
+        return values[self.q.index(low)], values[self.q.index(high)]
+
+    def clip(self, array, name, index=None, low=1, high=99):
+        return np.clip(array, *self.bounds(name, index, low, high))
@@ -0,0 +1,64 @@
+import numpy as np
+
+from normalize import nanpercentiles
+from products import clean, invalid_mask, orient, read_only
+
+# Panels drawn with another colormap than jet
+COLORMAPS = dict(wac='gray')
+
+
+def derive(data, kind, name, *args):
+    '''Cleaned, oriented, read-only `data.image(name)` or `data.plane(name, index)`.'''
+    return read_only(orient(clean(getattr(data, kind)(name, *args))))
+
+
+def panel_images(data, stats, index, percentile=True, mask_slope=True, ref_or_alb='reflectance', derived=derive, mask=None):
+    '''
+    (title, name, image) of the nine panels of the polarimetry grid at wavelength plane `index`.
+
+    `derived(data, kind, name, *args)` reads the products, the app passes a
+    cached version of `derive`. `mask` is the oriented invalid-pixel mask,
+    taken from `stats` if None. Without `stats` (no sidecar) the clip bounds
+    are the percentiles of the displayed images and the mask is computed from
+    the albedo and dolp cubes.
+    '''
+    # Only the selected wavelength plane of each cube is read, all arrays are read-only
+    wac         = derived(data, 'image', 'primary')
+    intensity   = derived(data, 'plane', 'intensity',  index)
+    comparisson = derived(data, 'plane', ref_or_alb,   index)
+    dolp        = derived(data, 'plane', 'dolp',       index)
+    aolp        = derived(data, 'plane', 'aolp',       index)
+    slope       = derived(data, 'image', f'{ref_or_alb}_slope')
+    intercept   = derived(data, 'image', f'{ref_or_alb}_intercept')
+    clusters    = derived(data, 'image', 'clusters')
+    grain_size  = derived(data, 'plane', 'grain_size', index)
+
+    if mask_slope:
+        if mask is None:
+            mask = orient(stats.mask() if stats is not None else invalid_mask(clean(data.cube('albedo')), clean(data.cube('dolp'))))
+        slope     = np.where(mask, np.nan, slope)
+        intercept = np.where(mask, np.nan, intercept)
+
+    if percentile:
+        if stats is not None:
+            # Clip bounds come from the sidecar, no need to scan the images
+            def bounds(image, name, index, low, high):
+                return stats.bounds(name, index, low, high, masked=mask_slope and index is None)
+        else:
+            def bounds(image, name, index, low, high):
+                return nanpercentiles(image[np.newaxis], [low, high])[0]
+        comparisson = np.clip(comparisson, *bounds(comparisson, ref_or_alb,   index, 1, 99))
+        dolp        = np.clip(dolp,        *bounds(dolp,        'dolp',       index, 1, 99))
+        aolp        = np.clip(aolp,        *bounds(aolp,        'aolp',       index, 1, 99))
+        slope       = np.clip(slope,       *bounds(slope,       f'{ref_or_alb}_slope',     None, 1, 95))
+        intercept   = np.clip(intercept,   *bounds(intercept,   f'{ref_or_alb}_intercept', None, 1, 99))
+        grain_size  = np.clip(grain_size,  *bounds(grain_size,  'grain_size', index, 1, 99))
+
+    intensity = intensity.astype(float)
+    intensity[intensity < 1e-12] = np.nan
+
+    return [
+        ('WAC', 'wac', wac), ('Intensity', 'intensity', intensity), (ref_or_alb.title(), ref_or_alb, comparisson),
+        ('SOM', 'clusters', clusters), ('DoLP', 'dolp', dolp), ('Slope', 'slope', slope),
+        ('Rel. Grain Size', 'grain_size', grain_size), ('AoLP', 'aolp', aolp), ('Intercept', 'intercept', intercept),
+    ]
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def clean(array):
+    '''Copy of `array` with zeros, which mark invalid pixels, set to NaN.'''
+    if np.issubdtype(array.dtype, np.integer):
+        return np.array(array)
+    array = np.array(array, dtype=array.dtype.newbyteorder('='))
+    array[array == 0] = np.nan
+    return array
+
+
+def orient(array):
+    '''Rotate an image (or the last two axes of a cube) into display orientation.'''
+    return np.ascontiguousarray(np.rot90(array, 2, axes=(-2, -1)))
+
+
+def nan_count(cube):
+    '''Number of invalid channels of each pixel of a cleaned cube.'''
+    return np.sum(np.isnan(cube), axis=0)
+
+
+def invalid_channels(cube):
+    '''Channels of a cleaned cube without a single valid pixel.'''
+    return np.all(np.isnan(cube), axis=(1,2))
+
+
+def mask_from_counts(albedo_count, dolp_count, invalid):
+    # If the number of invalid channels is greater than the number of global invalid channels, then the pixel is set to nan
+    return np.maximum(albedo_count, dolp_count) > np.sum(invalid)
+
+
+def invalid_mask(albedo, dolp):
+    '''
+    Pixels with more invalid channels than there are globally invalid channels.
+
+    `albedo` and `dolp` are cleaned cubes of shape (wavelengths, rows, cols).
+    '''
+    return mask_from_counts(nan_count(albedo), nan_count(dolp), invalid_channels(albedo) | invalid_channels(dolp))
+
+
+def read_only(array):
+    array.flags.writeable = False
+    return array
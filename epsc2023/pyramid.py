@@ -0,0 +1,76 @@
+import io
+import math
+import warnings
+
+import numpy as np
+from PIL import Image
+from matplotlib import colormaps
+
+TILE_SIZE = 256
+
+
+def _downsample(image):
+    '''Halve the resolution, averaging valid pixels (or picking them for labels).'''
+    if not np.issubdtype(image.dtype, np.floating):
+        return image[::2, ::2]
+    rows, cols = image.shape
+    padded = np.full((rows + rows % 2, cols + cols % 2), np.nan, dtype=image.dtype)
+    padded[:rows, :cols] = image
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    with warnings.catch_warnings():
+        # Blocks without any valid pixel stay NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmean(blocks, axis=(1, 3)).astype(image.dtype)
+
+
+class Pyramid:
+    '''
+    Image at halving resolutions, cut into fixed-size colored PNG tiles.
+
+    Level 0 is the full resolution image, the last level fits into a single
+    tile. Colors are scaled with the range of the full image on every level,
+    so tiles of different levels can be mixed.
+    '''
+
+    def __init__(self, image, cmap='jet', tile_size=TILE_SIZE):
+        image = np.asarray(image)
+        if np.issubdtype(image.dtype, np.floating):
+            image = image.astype(np.float32)
+        self.shape = image.shape
+        self.cmap = cmap
+        self.tile_size = tile_size
+        finite = image[np.isfinite(image)] if np.issubdtype(image.dtype, np.floating) else image
+        self.vmin, self.vmax = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+        self.levels = [image]
+        while max(self.levels[-1].shape) > tile_size:
+            self.levels.append(_downsample(self.levels[-1]))
+
+    def level_for(self, extent, viewport):
+        '''Coarsest level still showing `extent` full resolution pixels with at least `viewport` pixels.'''
+        level = math.floor(math.log2(max(extent / viewport, 1)))
+        return min(level, len(self.levels) - 1)
+
+    def tiles(self, level, window):
+        '''
+        Tiles of `level` overlapping `window` = (x0, x1, y0, y1) in full resolution pixels.
+
+        Yields (row, col) of the tile and the position of its first pixel
+        center together with the pixel size, in full resolution pixels.
+        '''
+        scale = 2 ** level
+        step = self.tile_size * scale
+        x0, x1, y0, y1 = window
+        rows, cols = self.levels[level].shape
+        for row in range(max(int(y0 // step), 0), min(math.ceil(y1 / step), math.ceil(rows / self.tile_size))):
+            for col in range(max(int(x0 // step), 0), min(math.ceil(x1 / step), math.ceil(cols / self.tile_size))):
+                yield (row, col), (col * step + (scale - 1) / 2, row * step + (scale - 1) / 2, scale)
+
+    def tile_png(self, level, row, col):
+        size = self.tile_size
+        tile = self.levels[level][row * size:(row + 1) * size, col * size:(col + 1) * size]
+        scaled = (tile.astype(np.float64) - self.vmin) / ((self.vmax - self.vmin) or 1)
+        rgba = colormaps[self.cmap](scaled, bytes=True)
+        rgba[..., 3] = np.where(np.isnan(scaled), 0, 255)
+        buffer = io.BytesIO()
+        Image.fromarray(rgba).save(buffer, format='png')
+        return buffer.getvalue()
@@ -0,0 +1,60 @@
+import numpy as np
+import pyvista as pv
+
+# Sphere resolution used up to a number of particles, beyond the last limit
+# the particles are drawn as point sprites instead of glyphs
+SPHERE_RESOLUTIONS = [(1000, 8), (5000, 6), (20000, 4)]
+
+
+def sphere_resolution(count):
+    """Theta/phi resolution of the particle spheres, None for point sprites."""
+    for limit, resolution in SPHERE_RESOLUTIONS:
+        if count <= limit:
+            return resolution
+    return None
+
+
+class AggregateMesh:
+    """
+    Renderable geometry of (a subset of) the particles of an aggregate.
+
+    Small aggregates are glyphed with spheres whose resolution drops with the
+    number of particles, large ones are kept as a point cloud and rendered as
+    sprites scaled by the particle radii.
+    """
+
+    def __init__(self, position, radii):
+        self.count = len(position)
+        point_cloud = pv.PolyData(np.asarray(position, dtype=float))
+
+        self.resolution = sphere_resolution(len(position))
+        if self.resolution is None:
+            point_cloud["radius"] = np.asarray(radii, dtype=float)
+            self.mesh = point_cloud
+        else:
+            # Glyph spheres have a radius of 0.5
+            point_cloud["radius"] = [2 * i for i in radii]
+            geom = pv.Sphere(
+                theta_resolution=self.resolution, phi_resolution=self.resolution
+            )
+            self.mesh = point_cloud.glyph(scale="radius", geom=geom, orient=False)
+
+    @property
+    def sprites(self):
+        return self.resolution is None
+
+    def __sizeof__(self):
+        return int(self.mesh.actual_memory_size * 1024)
+
+    def add_to(self, plotter):
+        if self.sprites:
+            actor = plotter.add_mesh(
+                self.mesh,
+                color="white",
+                style="points_gaussian",
+                emissive=False,
+                render_points_as_spheres=True,
+            )
+            actor.mapper.scale_array = "radius"
+        else:
+            plotter.add_mesh(self.mesh, color="white", smooth_shading=True, pbr=True)
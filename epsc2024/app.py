@@ -1,20 +1,39 @@
+import os
+import sys
+
 import streamlit as st
 import numpy as np
-import bz2
-import _pickle
-import glob
 
-from plotly.subplots import make_subplots
-from plotly import colors
 import plotly.graph_objects as go
 
 import pyvista as pv
 from stpyvista import stpyvista
 from stpyvista.utils import start_xvfb
 
+from store import open_store
+from sidebar import catalog_runs
+from lod import FieldLOD, POINT_BUDGET
+from field import LogField
+from aggregate import AggregateMesh
+from spatial import ParticleIndex
+from sphere import EqualAreaGrid, levels, log_extent, log_radius, vertex_count
+from figures import (
+    ANIMATION_MAX_FRAMES,
+    PLOT_TYPES,
+    angular_figure,
+    animate,
+    field_figure,
+    frame_indices,
+    mixing_components_figure,
+    phase_function_figure,
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cache import shared_cache, file_version
+from common.timing import timed
+
 DATA_DIR = "epsc2024/out"
 EXTENSION = "pbz2"
-length_suffix = "μm"
 cross_section_scale = 1e6
 
 st.set_page_config(page_title="YASF", layout="wide")
@@ -24,310 +43,321 @@ if "IS_XVFB_RUNNING" not in st.session_state:
     st.session_state.IS_XVFB_RUNNING = True
 
 
-# @st.cache
 def load_data(path):
-    data = bz2.BZ2File(path, "rb")
-    data = _pickle.load(data)
+    return shared_cache.get_or_load(
+        ("epsc2024", path), file_version(path), lambda: open_store(path)
+    )
 
-    return data
+
+def particle_index(path, position, radii):
+    return shared_cache.get_or_load(
+        ("epsc2024", path, "particle_index"),
+        file_version(path),
+        lambda: ParticleIndex(position, radii),
+    )
+
+
+def aggregate_mesh(path, index, query=None):
+    # Only the particles of a slab or sphere query are rendered. Query meshes
+    # change with every slider step and would fill the cache with meshes
+    # that are used once, so only the full aggregate is cached
+    if query is not None:
+        kind, *args = query
+        subset = getattr(index, kind)(*args)
+        return AggregateMesh(index.position[subset], index.radii[subset])
+    return shared_cache.get_or_load(
+        ("epsc2024", path, "aggregate_mesh"),
+        file_version(path),
+        lambda: AggregateMesh(index.position, index.radii),
+    )
+
+
+def sphere_grid(path, rings, polar_angles, azimuthal_angles):
+    return shared_cache.get_or_load(
+        ("epsc2024", path, "sphere_grid", rings),
+        file_version(path),
+        lambda: EqualAreaGrid(rings, polar_angles, azimuthal_angles),
+    )
+
+
+def phase_function_extent(path, key, three_d, absolute, polar_angles, azimuthal_angles):
+    # Computed once per file and quantity for all wavelengths
+    return shared_cache.get_or_load(
+        ("epsc2024", path, "phase_function_extent", key, absolute),
+        file_version(path),
+        lambda: log_extent(three_d, absolute, polar_angles, azimuthal_angles),
+    )
+
+
+def log_field(path, scattered_field):
+    # Computed once per file for all wavelengths, the slider only indexes it
+    return shared_cache.get_or_load(
+        ("epsc2024", path, "log_field"),
+        file_version(path),
+        lambda: LogField(scattered_field),
+    )
+
+
+def field_lod(path, sampling_points, vals_log):
+    return shared_cache.get_or_load(
+        ("epsc2024", path, "field_lod", POINT_BUDGET),
+        file_version(path),
+        lambda: FieldLOD(sampling_points, vals_log),
+    )
 
 
 # st.title('Yet Another Scattering Framework')
 # st.header('Data visualizer of the LPSC 2023 abstract of Arnaut et al. [2997](https://www.hou.usra.edu/meetings/lpsc2023/pdf/2997.pdf)')
 data_file = f"{DATA_DIR}/*.{EXTENSION}"
 with st.sidebar:
-    path = rf"{DATA_DIR}/*.{EXTENSION}"
-    files = glob.glob(path)
-    data_file = st.selectbox("File", sorted(files), 0)
+    files = [run["path"] for run in catalog_runs(DATA_DIR)]
+    data_file = st.selectbox("File", files, 0)
+    with st.expander("Cache"):
+        st.json(shared_cache.stats())
+    # Seconds of the last run of each panel, updated on the next full rerun
+    timings = st.session_state.setdefault("timings", {})
+    with st.expander("Timings"):
+        st.json({name: round(seconds, 4) for name, seconds in timings.items()})
+if data_file is None:
+    st.warning("No result file matches the search and filters")
+    st.stop()
 
 data = load_data(data_file)
 # print(data['angle']['data']['phase_function'])
 # print(data['wavelength']['data']['scattering_cross_section'])
 
-position = np.array(data["particles"]["position"])
-radii = np.array(data["particles"]["radii"])
-
-wavelength = np.array(data["wavelength"]["value"])
+wavelength = np.array(data["wavelength/value"])
 scattering_cross_section = (
-    data["wavelength"]["data"]["scattering_cross_section"] * cross_section_scale**2
+    data["wavelength/data/scattering_cross_section"] * cross_section_scale**2
 )
 extinction_cross_section = (
-    data["wavelength"]["data"]["extinction_cross_section"] * cross_section_scale**2
+    data["wavelength/data/extinction_cross_section"] * cross_section_scale**2
 )
-single_scattering_albedo = data["wavelength"]["data"]["single_scattering_albedo"]
-
-sampling_points = np.array(data["field"]["sampling_points"]) * 1e-3
-scattered_field = data["field"]["scattered_field"]
-
-scattering_angles = np.array(data["angle"]["value"])
-polar_angles = data["angle"]["data"]["polar_angles"]
-azimuthal_angles = data["angle"]["data"]["azimuthal_angles"]
-phase_function = data["angle"]["data"]["phase_function"]["normal"]
-phase_function_3d = data["angle"]["data"]["phase_function"]["spatial"]
-degree_of_linear_polarization = data["angle"]["data"]["degree_of_linear_polarization"][
-    "normal"
-]
-degree_of_linear_polarization_3d = data["angle"]["data"][
-    "degree_of_linear_polarization"
-]["spatial"]
-degree_of_linear_polarization_q = data["angle"]["data"][
-    "degree_of_linear_polarization_q"
-]["normal"]
-degree_of_linear_polarization_q_3d = data["angle"]["data"][
-    "degree_of_linear_polarization_q"
-]["spatial"]
-degree_of_linear_polarization_u = data["angle"]["data"][
-    "degree_of_linear_polarization_u"
-]["normal"]
-degree_of_linear_polarization_u_3d = data["angle"]["data"][
-    "degree_of_linear_polarization_u"
-]["spatial"]
-degree_of_circular_polarization = data["angle"]["data"][
-    "degree_of_circular_polarization"
-]["normal"]
-degree_of_circular_polarization_3d = data["angle"]["data"][
-    "degree_of_circular_polarization"
-]["spatial"]
-
-# indices = [0, 1, -2]
-# import pandas as pd
-# export = {
-#   'angles': scattering_angles * 180 / np.pi
-# }
-# for idx in indices:
-#   export[wavelength[idx]] = degree_of_linear_polarization[:, idx]
-# # print(export)
-# export = pd.DataFrame(data=export)
-# export.to_csv(data_file.replace('pbz2', 'csv'), index=False)
+single_scattering_albedo = data["wavelength/data/single_scattering_albedo"]
 
 
-with st.sidebar:
-    wavelength_slider = st.slider("Wavelength Slider", 0, wavelength.size - 1, 0, 1)
-    st.write(f"Current wavelength: {wavelength[wavelength_slider] / 1e3:.2f}&mu;m")
-
-    plot_type_options = {
-        "Phase Function": dict(
-            normal=phase_function, three_d=phase_function_3d, type="log"
-        ),
-        "Linear Polarization": dict(
-            normal=degree_of_linear_polarization,
-            three_d=degree_of_linear_polarization_3d,
-            type="-",
-        ),
-        "Linear Polarization - Q": dict(
-            normal=degree_of_linear_polarization_q,
-            three_d=np.abs(degree_of_linear_polarization_q_3d),
-            type="-",
-        ),
-        "Linear Polarization - U": dict(
-            normal=degree_of_linear_polarization_u,
-            three_d=np.abs(degree_of_linear_polarization_u_3d),
-            type="-",
-        ),
-        "Circular Polarization": dict(
-            normal=degree_of_circular_polarization,
-            three_d=np.abs(degree_of_circular_polarization_3d),
-            type="-",
-        ),
-    }
-    plot_type = st.selectbox("Plot Type", plot_type_options.keys(), 0)
+# Panels are fragments, a widget only reruns the panel it belongs to (and
+# the panels nested in it). Changing the file reruns everything.
 
-with st.container():
-    col1, col2 = st.columns([1, 2])
-    with col1:
-        position -= np.mean(position, axis=0)
-        point_cloud = pv.PolyData(position)
-        point_cloud["radius"] = [2 * i for i in radii]
-
-        geom = pv.Sphere(theta_resolution=8, phi_resolution=8)
-        glyphed = point_cloud.glyph(scale="radius", geom=geom, orient=False)
-        pl = pv.Plotter(window_size=[400, 400])
-        pl.add_mesh(glyphed, color="white", smooth_shading=True, pbr=True)
-        pl.view_isometric()
-        pl.link_views()
-        stpyvista(pl)
-    with col2:
-        eps = np.finfo(float).eps
-
-        vals = np.linalg.norm(np.abs(scattered_field), axis=2)
-        vals_log = np.log(vals + eps)
-        vals_log_min = np.min(vals_log)
-        vals_log_max = np.max(vals_log)
-
-        tick_vals_log = np.linspace(vals_log_min, vals_log_max, 15)
-        tick_vals = [f"{x:.2e}" for x in np.exp(tick_vals_log) - eps]
-
-        fig = go.Figure(
-            data=go.Volume(
-                x=sampling_points[:, 0].flatten(),
-                y=sampling_points[:, 1].flatten(),
-                z=sampling_points[:, 2].flatten(),
-                value=vals_log[wavelength_slider, :],
-                isomin=vals_log_min,
-                isomax=vals_log_max,
-                opacity=0.1,  # needs to be small to see through all surfaces
-                surface_count=15,  # needs to be a large number for good volume rendering
-                colorscale="jet",
-                colorbar=dict(
-                    tickvals=tick_vals_log,
-                    ticktext=tick_vals,
-                ),
+
+@st.fragment
+def aggregate_panel(data_file):
+    data = load_data(data_file)
+    with timed("Aggregate", timings):
+        position = data["particles/position"]
+        radii = np.array(data["particles/radii"])
+        index = particle_index(data_file, position, radii)
+        low, high = index.bounds
+        with st.expander("Inspect aggregate"):
+            point = np.array(
+                [
+                    st.number_input(axis, float(low[i]), float(high[i]), 0.0)
+                    for i, axis in enumerate("xyz")
+                ]
+            )
+            crop = st.radio("Show", ["All", "Slab", "Sphere"], horizontal=True)
+            if crop == "Slab":
+                axis = "xyz".index(st.radio("Axis", ["x", "y", "z"], horizontal=True))
+                bounds = (float(low[axis]), float(high[axis]))
+                query = ("slab", axis, *st.slider("Range", *bounds, bounds))
+            elif crop == "Sphere":
+                size = float(np.max(high - low))
+                query = (
+                    "sphere",
+                    tuple(point),
+                    st.slider("Radius", 0.0, size, size / 4),
+                )
+            else:
+                query = None
+
+            neighbourhood = st.number_input(
+                "Neighbourhood radius",
+                float(np.min(radii)),
+                value=float(4 * np.mean(radii)),
+            )
+            distance, nearest = index.nearest(point)
+            st.write(
+                f"Nearest particle: #{nearest} at {distance:.3g}, "
+                f"radius {index.radii[nearest]:.3g}, "
+                f"{index.neighbour_counts(neighbourhood, [nearest])[0]} neighbours, "
+                f"packing density {index.packing_density(neighbourhood, [nearest])[0]:.2f}"
             )
+
+        # The full mesh is cached per file, a wavelength change reuses it
+        mesh = aggregate_mesh(data_file, index, query)
+        if query is not None:
+            st.caption(f"{mesh.count:,} of {len(index):,} particles shown")
+        if mesh.count:
+            pl = pv.Plotter(window_size=[400, 400])
+            mesh.add_to(pl)
+            pl.view_isometric()
+            pl.link_views()
+            stpyvista(pl)
+
+
+@st.fragment
+def wavelength_panels(data_file):
+    data = load_data(data_file)
+    wavelength = np.array(data["wavelength/value"])
+    with timed("Field", timings):
+        col1, col2, col3 = st.columns(3)
+        # A run with a single wavelength has nothing to animate or select
+        animation = False
+        if wavelength.size > 1:
+            with col2:
+                animation = st.checkbox(
+                    "Animate wavelengths",
+                    help="Field and 3D plots get all wavelengths (up to the frame "
+                    "cap) at once and are scrubbed in the browser, without reruns",
+                )
+        animation_frames = None
+        if animation:
+            with col3:
+                max_frames = st.number_input(
+                    "Max. frames", 2, None, min(ANIMATION_MAX_FRAMES, wavelength.size)
+                )
+            animation_frames = frame_indices(wavelength.size, max_frames)
+            animation_labels = [
+                f"{wavelength[i] / 1e3:.2f}μm" for i in animation_frames
+            ]
+        with col1:
+            wavelength_slider = 0
+            if wavelength.size > 1:
+                wavelength_slider = st.slider(
+                    "Wavelength Slider",
+                    0,
+                    wavelength.size - 1,
+                    0,
+                    1,
+                    disabled=animation,
+                )
+            st.write(
+                f"Current wavelength: {wavelength[wavelength_slider] / 1e3:.2f}&mu;m"
+            )
+
+        sampling_points = np.array(data["field/sampling_points"]) * 1e-3
+        scattered_field = data["field/scattered_field"]
+        # Coarse grid first, finer levels (up to the point budget) on request
+        field = log_field(data_file, scattered_field)
+        lod = field_lod(data_file, sampling_points, field.values)
+        field_level = st.select_slider(
+            "Field detail",
+            list(range(len(lod))),
+            0,
+            lambda level: f"{lod.size(level):,} points",
         )
-        fig.update_layout(
-            height=800,
-            title="Electric Field",
-            scene=dict(
-                xaxis=dict(ticksuffix=length_suffix),
-                yaxis=dict(ticksuffix=length_suffix),
-                zaxis=dict(ticksuffix=length_suffix),
+        fig = field_figure(
+            *lod.level(
+                field_level, animation_frames[0] if animation else wavelength_slider
             ),
+            field.min,
+            field.max,
+            (field.tick_vals_log, field.tick_vals),
         )
+        if animation:
+            # Frames only carry the values, the nodes are the same for all wavelengths
+            frames = [
+                [go.Volume(value=lod.level(field_level, i)[1].astype(np.float32))]
+                for i in animation_frames
+            ]
+            animate(fig, frames, animation_labels)
         st.plotly_chart(fig, use_container_width=True)
 
-with st.container():
-    fig = make_subplots(rows=1, cols=3, shared_xaxes=True, vertical_spacing=0.02)
-    # Scattering Cross-Section
-    fig.add_trace(
-        go.Scatter(
-            x=wavelength / 1e3, y=scattering_cross_section, name="C<sub>sca</sub>"
-        ),
-        row=1,
-        col=1,
-    )
-    # Extinction Cross-Section
-    fig.add_trace(
-        go.Scatter(
-            x=wavelength / 1e3, y=extinction_cross_section, name="C<sub>ext</sub>"
-        ),
-        row=1,
-        col=2,
-    )
-    # Single-Scattering Albedo
-    fig.add_trace(
-        go.Scatter(x=wavelength / 1e3, y=single_scattering_albedo, name="w"),
-        row=1,
-        col=3,
-    )
+    phase_function_panels(data_file, wavelength_slider, animation_frames)
 
-    fig.update_layout(
-        title="Mixing components",
-        height=900,
-        xaxis3=dict(title="Wavelength", ticksuffix="&mu;m"),
-        yaxis1=dict(
-            title="Scattering Cross-section", showexponent="all", exponentformat="e"
-        ),
-        yaxis2=dict(
-            title="Extinction Cross-section", showexponent="all", exponentformat="e"
-        ),
-        yaxis3=dict(title="Single-Scattering Albedo"),
-    )
-    st.plotly_chart(fig, use_container_width=True)
 
-with st.container():
-    col1, col2 = st.columns(2)
+@st.fragment
+def phase_function_panels(data_file, wavelength_slider, animation_frames=None):
+    data = load_data(data_file)
+    with timed("Phase function", timings):
+        wavelength = np.array(data["wavelength/value"])
+        scattering_angles = np.array(data["angle/value"])
+        polar_angles = data["angle/data/polar_angles"]
+        azimuthal_angles = data["angle/data/azimuthal_angles"]
+        animation = animation_frames is not None
+        if animation:
+            animation_labels = [
+                f"{wavelength[i] / 1e3:.2f}μm" for i in animation_frames
+            ]
 
-    with col1:
-        fig = make_subplots(
-            rows=2, cols=1, specs=[[{"type": "xy"}], [{"type": "polar"}]]
-        )
-        cmap = colors.sample_colorscale("Jet", np.linspace(0, 1, wavelength.size))
-        for wavelength_index in range(wavelength.size):
-            fig.add_trace(
-                go.Scatter(
-                    x=scattering_angles * 180 / np.pi,
-                    y=plot_type_options[plot_type]["normal"][:, wavelength_index],
-                    line=dict(color=cmap[wavelength_index]),
-                    name="Linear Plot",
-                    text=f"λ = {wavelength[wavelength_index]}",
-                    legendgrouptitle_text=f"p(θ, {wavelength[wavelength_index]:.2f}nm)",
-                    legendgroup=f"group{wavelength_index}",
-                ),
-                row=1,
-                col=1,
+        plot_type = st.selectbox("Plot Type", PLOT_TYPES.keys(), 0)
+        # Only the selected quantity is read from the store
+        plot_type_key = PLOT_TYPES[plot_type]["key"]
+        plot_type_normal = data[f"angle/data/{plot_type_key}/normal"]
+        plot_type_three_d = data[f"angle/data/{plot_type_key}/spatial"]
+        plot_type_absolute = PLOT_TYPES[plot_type]["absolute"]
+
+        col1, col2 = st.columns(2)
+        with col1:
+            fig = angular_figure(
+                scattering_angles, wavelength, plot_type_normal, plot_type
             )
-            fig.add_trace(
-                go.Scatterpolar(
-                    theta=np.concatenate(
-                        (scattering_angles, 2 * np.pi - np.flip(scattering_angles))
-                    )
-                    * 180
-                    / np.pi,
-                    r=np.concatenate(
-                        (
-                            plot_type_options[plot_type]["normal"][:, wavelength_index],
-                            np.flip(
-                                plot_type_options[plot_type]["normal"][
-                                    :, wavelength_index
-                                ]
-                            ),
-                        )
-                    ),
-                    line=dict(color=cmap[wavelength_index]),
-                    name="Polar Plot",
-                    legendgroup=f"group{wavelength_index}",
-                ),
-                row=2,
-                col=1,
+            st.plotly_chart(fig, use_container_width=True)
+
+        with col2:
+            # %% phase function
+            # Only the selected wavelength is transformed and resampled onto an
+            # equal-area grid, rendered as a surface within the payload budget
+            rings = levels(polar_angles.size)
+            phase_rings = st.select_slider(
+                "Sphere resolution",
+                rings,
+                rings[-1],
+                lambda x: f"{vertex_count(x):,} vertices",
             )
-            fig.update_layout(
-                title="Log-plot and Polar-plot of the " + plot_type,
-                height=1000,
-                xaxis1=dict(
-                    title="Phase Angle",
-                    ticksuffix="°",
-                    tickmode="linear",
-                    tick0=0,
-                    dtick=45,
+            grid = sphere_grid(data_file, phase_rings, polar_angles, azimuthal_angles)
+
+            def phase_function_surface(index):
+                return grid.surface(
+                    log_radius(plot_type_three_d[:, index], plot_type_absolute)
+                )
+
+            fig = phase_function_figure(
+                *phase_function_surface(
+                    animation_frames[0] if animation else wavelength_slider
                 ),
-                yaxis1=dict(title=plot_type, type=plot_type_options[plot_type]["type"]),
-                polar=dict(
-                    radialaxis=dict(type=plot_type_options[plot_type]["type"], dtick=1)
+                phase_function_extent(
+                    data_file,
+                    plot_type_key,
+                    plot_type_three_d,
+                    plot_type_absolute,
+                    polar_angles,
+                    azimuthal_angles,
                 ),
+                "3D representation of the " + plot_type,
             )
-        st.plotly_chart(fig, use_container_width=True)
+            if animation:
+                frames = []
+                for i in animation_frames:
+                    vertices, surface_colors = phase_function_surface(i)
+                    vertices = vertices.astype(np.float32)
+                    frames.append(
+                        [
+                            go.Surface(
+                                x=vertices[..., 0],
+                                y=vertices[..., 1],
+                                z=vertices[..., 2],
+                                surfacecolor=surface_colors.astype(np.float32),
+                            )
+                        ]
+                    )
+                animate(fig, frames, animation_labels)
+            st.plotly_chart(fig, use_container_width=True)
 
+
+with st.container():
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        aggregate_panel(data_file)
     with col2:
-        points = np.vstack(
-            [
-                np.sin(polar_angles) * np.cos(azimuthal_angles),
-                np.sin(polar_angles) * np.sin(azimuthal_angles),
-                np.cos(polar_angles),
-            ]
-        ).T
-
-        # %% phase function
-        p = np.log(plot_type_options[plot_type]["three_d"] + 1)
-        fig = go.Figure(
-            go.Scatter3d(
-                x=points[:, 0] * p[:, wavelength_slider],
-                y=points[:, 1] * p[:, wavelength_slider],
-                z=points[:, 2] * p[:, wavelength_slider],
-                mode="markers",
-                marker=dict(
-                    size=1, color=p[:, wavelength_slider], colorscale="Jet", opacity=0.8
-                ),
+        with timed("Mixing components", timings):
+            fig = mixing_components_figure(
+                wavelength,
+                scattering_cross_section,
+                extinction_cross_section,
+                single_scattering_albedo,
             )
-        )
-        p_max = np.max(p, axis=1)
-        points_extrem = points * np.max(p, axis=1)[:, np.newaxis]
-        fig.update_layout(
-            title="3D representation of the " + plot_type,
-            height=800,
-            scene=dict(
-                xaxis=dict(
-                    range=[np.min(points_extrem[:, 0]), np.max(points_extrem[:, 0])],
-                    showticklabels=False,
-                ),
-                yaxis=dict(
-                    range=[np.min(points_extrem[:, 1]), np.max(points_extrem[:, 1])],
-                    showticklabels=False,
-                ),
-                zaxis=dict(
-                    range=[np.min(points_extrem[:, 2]), np.max(points_extrem[:, 2])],
-                    showticklabels=False,
-                ),
-                aspectratio=dict(x=1, y=1, z=1),
-            ),
-        )
-        st.plotly_chart(fig, use_container_width=True)
+            st.plotly_chart(fig, use_container_width=True)
+
+
+wavelength_panels(data_file)
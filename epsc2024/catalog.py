@@ -0,0 +1,294 @@
+import os
+import time
+import sqlite3
+import argparse
+import threading
+from contextlib import closing
+
+import numpy as np
+
+from store import STORE_SUFFIX, open_store
+from runs import convert_stale
+from grids import fingerprint
+
+DATA_DIR = "epsc2024/out"
+EXTENSION = "pbz2"
+CATALOG_FILE = "catalog.sqlite"
+# Reruns within this many seconds of the last scan use the catalog as it is
+RESCAN_SECONDS = float(os.environ.get("CATALOG_RESCAN_SECONDS", 60))
+
+# Catalogs whose new files are being described in a background thread
+_describing = set()
+_describing_lock = threading.Lock()
+
+# Column name and SQL type of every catalogued attribute, in table order
+COLUMNS = {
+    "path": "TEXT PRIMARY KEY",
+    "size": "INTEGER",
+    "mtime": "REAL",
+    "wavelength_min": "REAL",
+    "wavelength_max": "REAL",
+    "wavelength_count": "INTEGER",
+    "wavelength_fingerprint": "TEXT",
+    "angle_count": "INTEGER",
+    "particle_count": "INTEGER",
+    "radius_min": "REAL",
+    "radius_max": "REAL",
+    "field_points": "INTEGER",
+    # Why the run could not be described, NULL for readable runs
+    "error": "TEXT",
+}
+
+
+def _files(data_dir):
+    # os.scandir hands out the stat results without another system call per file
+    stack = [data_dir]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                # Stores and the hidden directories of conversions hold no result files
+                skip = entry.name.endswith(STORE_SUFFIX) or entry.name.startswith(".")
+                if not skip:
+                    stack.append(entry.path)
+            elif entry.name.endswith(f".{EXTENSION}"):
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+
+def describe(path):
+    """Catalog attributes of one run, read from its (memory-mapped) store."""
+    data = open_store(path)
+    wavelengths = np.array(data["wavelength/value"])
+    radii = np.asarray(data["particles/radii"])
+    return dict(
+        wavelength_min=float(wavelengths.min()),
+        wavelength_max=float(wavelengths.max()),
+        wavelength_count=len(wavelengths),
+        wavelength_fingerprint=fingerprint(wavelengths),
+        angle_count=data.shape("angle/value")[0],
+        particle_count=data.shape("particles/position")[0],
+        radius_min=float(radii.min()),
+        radius_max=float(radii.max()),
+        field_points=data.shape("field/sampling_points")[0],
+    )
+
+
+class Catalog:
+    """
+    SQLite index of the result files below `data_dir`.
+
+    `scan` only describes files that are new or whose size or mtime
+    changed, and drops the rows of files that are gone. It does so in two
+    steps: `sync` adds those files with their path, size and mtime only,
+    `describe_pending` fills in the attributes, which needs their stores.
+    Files that can't be read, e.g. truncated ones, keep their error instead
+    and are tried again once their size or mtime changes. Queries never open
+    a result file and leave those out.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, path=None):
+        self.data_dir = data_dir
+        self.path = path or os.path.join(data_dir, CATALOG_FILE)
+        with closing(self.connect()) as db, db:
+            columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+            db.execute(f"CREATE TABLE IF NOT EXISTS runs ({columns})")
+            known = {row["name"] for row in db.execute("PRAGMA table_info(runs)")}
+            for name, kind in COLUMNS.items():
+                if name not in known:
+                    # Catalogs of older versions lack the newer columns
+                    db.execute(f"ALTER TABLE runs ADD COLUMN {name} {kind}")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)"
+            )
+
+    def connect(self):
+        # One connection per call, Streamlit serves every session from its own thread
+        db = sqlite3.connect(self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @property
+    def scanned(self):
+        """Time of the last finished scan, 0 if there was none."""
+        with closing(self.connect()) as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'scanned'").fetchone()
+        return row[0] if row else 0.0
+
+    def sync(self):
+        """
+        Add new and changed files without their attributes, drop removed ones.
+
+        Only stats files, so it is quick even for a large `data_dir`.
+        Returns the paths that were added or changed and the ones removed.
+        """
+        files = {path: (size, mtime) for path, size, mtime in _files(self.data_dir)}
+        with closing(self.connect()) as db:
+            known = {
+                row["path"]: (row["size"], row["mtime"])
+                for row in db.execute("SELECT path, size, mtime FROM runs")
+            }
+        changed = sorted(path for path in files if known.get(path) != files[path])
+        removed = sorted(path for path in known if path not in files)
+        with closing(self.connect()) as db, db:
+            db.executemany("DELETE FROM runs WHERE path = ?", [(p,) for p in removed])
+            db.executemany(
+                "INSERT OR REPLACE INTO runs (path, size, mtime) VALUES (?, ?, ?)",
+                [(path, *files[path]) for path in changed],
+            )
+            db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('scanned', ?)", (time.time(),)
+            )
+        return changed, removed
+
+    def pending(self):
+        """Paths of the runs whose attributes are not described yet."""
+        with closing(self.connect()) as db:
+            return [
+                row["path"]
+                for row in db.execute(
+                    "SELECT path FROM runs "
+                    "WHERE wavelength_count IS NULL AND error IS NULL ORDER BY path"
+                )
+            ]
+
+    def failed(self):
+        """Errors of the runs that could not be described, by path."""
+        with closing(self.connect()) as db:
+            return {
+                row["path"]: row["error"]
+                for row in db.execute(
+                    "SELECT path, error FROM runs WHERE error IS NOT NULL ORDER BY path"
+                )
+            }
+
+    def describe_pending(self, progress=None):
+        """
+        Describe the runs `sync` added, returns the paths of the readable ones.
+
+        `progress(done, total, path)` is passed on to `convert_stale`. The
+        error of a run that can't be read is stored in its row, it doesn't
+        stop the others.
+        """
+        pending = self.pending()
+        # Describing a run reads its store, converting them is the slow part
+        failed = {}
+        convert_stale(pending, progress, failed)
+        attributes = [
+            name for name in COLUMNS if name not in ("path", "size", "mtime", "error")
+        ]
+        described = []
+        for path in pending:
+            if path not in failed:
+                try:
+                    row = describe(path)
+                except Exception as error:
+                    # Also if it was removed since the sync, the next one drops its row
+                    failed[path] = error
+            with closing(self.connect()) as db, db:
+                if path in failed:
+                    error = failed[path]
+                    db.execute(
+                        "UPDATE runs SET error = ? WHERE path = ?",
+                        (f"{type(error).__name__}: {error}", path),
+                    )
+                    continue
+                db.execute(
+                    f"UPDATE runs SET {', '.join(f'{n} = :{n}' for n in attributes)} "
+                    "WHERE path = :path",
+                    dict(row, path=path),
+                )
+            described.append(path)
+        return described
+
+    def scan(self, progress=None):
+        """
+        Bring the catalog up to date with the files on disk.
+
+        Returns the paths that were (re)described and the ones removed.
+        `progress(done, total, path)` is passed on to `convert_stale`.
+        """
+        _, removed = self.sync()
+        return self.describe_pending(progress), removed
+
+    def scan_in_background(self):
+        """
+        `sync` now and describe the new runs in a background thread.
+
+        Until they are described, new runs are listed by `query` without
+        their attributes. At most one thread describes runs per catalog.
+        """
+        changed, removed = self.sync()
+        with _describing_lock:
+            if self.path in _describing or not self.pending():
+                return changed, removed
+            _describing.add(self.path)
+
+        def work():
+            try:
+                self.describe_pending()
+            finally:
+                with _describing_lock:
+                    _describing.discard(self.path)
+
+        threading.Thread(target=work, daemon=True).start()
+        return changed, removed
+
+    def scan_if_due(self, max_age=RESCAN_SECONDS, progress=None, background=False):
+        if time.time() - self.scanned >= max_age:
+            if background:
+                return self.scan_in_background()
+            return self.scan(progress)
+        return [], []
+
+    def ranges(self):
+        """Smallest and largest value of every numeric column over all runs."""
+        numeric = [
+            name for name, kind in COLUMNS.items() if kind in ("REAL", "INTEGER")
+        ]
+        select = ", ".join(f"MIN({name}), MAX({name})" for name in numeric)
+        with closing(self.connect()) as db:
+            row = db.execute(f"SELECT {select} FROM runs").fetchone()
+        return {name: (row[2 * i], row[2 * i + 1]) for i, name in enumerate(numeric)}
+
+    def query(self, search="", **ranges):
+        """
+        Runs whose path contains `search` and whose attributes lie in `ranges`.
+
+        Every keyword is a column name with an inclusive (low, high) pair,
+        e.g. `particle_count=(100, 5000)`. Runs that are not described yet
+        pass every range, runs that can't be read are left out.
+        """
+        where, args = ["error IS NULL", "instr(path, ?) > 0"], [search]
+        for name, (low, high) in ranges.items():
+            if name not in COLUMNS:
+                raise KeyError(name)
+            where.append(f"({name} BETWEEN ? AND ? OR {name} IS NULL)")
+            args += [low, high]
+        with closing(self.connect()) as db:
+            return [
+                dict(row)
+                for row in db.execute(
+                    f"SELECT * FROM runs WHERE {' AND '.join(where)} ORDER BY path",
+                    args,
+                )
+            ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"Index the .{EXTENSION} result files into a SQLite catalog"
+    )
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    args = parser.parse_args()
+
+    catalog = Catalog(args.data_dir)
+    changed, removed = catalog.scan(
+        lambda done, total, path: print(f"Converted {done}/{total}: {path}")
+    )
+    for path, error in catalog.failed().items():
+        print(f"Could not read {path}: {error}")
+    print(f"{len(changed)} runs indexed, {len(removed)} removed")
@@ -1,7 +1,5 @@
 import os
-import bz2
-import _pickle
-from glob import glob
+import sys
 
 import streamlit as st
 import numpy as np
@@ -10,29 +8,236 @@ from plotly.subplots import make_subplots
 from plotly import colors
 import plotly.graph_objects as go
 
+from store import open_store
+from sidebar import catalog_runs
+from runs import QUANTITIES, convert_stale, load_run, resample_run
+from grids import common_grid, fingerprint
+from figures import cached_figure, envelope_traces
+from ensemble import Ensemble
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cache import shared_cache, file_version
+from common.timing import timed
+
 DATA_DIR = "epsc2024/out"
 EXTENSION = "pbz2"
-CROSS_SECTION_SCALE = 1e6
 CMAP_TYPE = "Turbo"
 CMAP_DELTA = 0.1
+# Wavelength indices of the fixed phase function and DoLP panels
+MANUAL_INDICES = [1, 6, 11]
+# Figures with more points than this are drawn with WebGL. Each of them holds
+# a WebGL context and browsers drop the oldest ones beyond about 16
+WEBGL_POINTS = int(os.environ.get("WEBGL_POINTS", 100_000))
+# WebGL figures on one page at most, the mixing components, the wavelengths
+# and the two fixed panels together
+WEBGL_FIGURES = 12
 st.set_page_config(page_title="", layout="wide")
 
-files_cbox = {}
+
+def load_data(path):
+    return shared_cache.get_or_load(
+        ("epsc2024", path), file_version(path), lambda: open_store(path)
+    )
+
+
+def scatter_type(points, webgl=True):
+    """Trace type of a figure with `points` points, WebGL only for large ones."""
+    return go.Scattergl if webgl and points > WEBGL_POINTS else go.Scatter
+
+
+def compare_figure(files, panel, build):
+    # Figures are kept per file selection and panel, reruns with
+    # an unchanged selection send them again without rebuilding any trace
+    return cached_figure(
+        shared_cache,
+        ("epsc2024", "compare", tuple(files), panel),
+        tuple(file_version(file) for file in files),
+        build,
+    )
+
+
 with st.sidebar:
+    matching = [run["path"] for run in catalog_runs(DATA_DIR)]
     form = st.form("files")
-    path = f"{DATA_DIR}/**/*.{EXTENSION}"
-    files = glob(path, recursive=True)
-    form.write("Files")
-    for i, f in enumerate(sorted(files)):
-        files_cbox[f] = form.checkbox(f, value=(i == 0))
+    selected = form.multiselect("Files", matching, matching[:1])
+    all_matching = form.checkbox(f"All {len(matching)} matching files")
     submit = form.form_submit_button("Submit")
-files = [key for key, value in files_cbox.items() if value]
+    ensemble_mode = st.toggle(
+        "Ensemble statistics",
+        help="Stream the selected files one at a time and show mean, spread and "
+        "quantiles instead of one line per file",
+    )
+    with st.expander("Cache"):
+        st.json(shared_cache.stats())
+    # Seconds of the last run of each panel, updated on the next full rerun
+    timings = st.session_state.setdefault("timings", {})
+    with st.expander("Timings"):
+        st.json({name: round(seconds, 4) for name, seconds in timings.items()})
+files = matching if all_matching else selected
 if not files:
     st.warning("Please select at least one file")
     st.stop()
 
-wavelengths = None
-scattering_angles = None
+
+def target_grids(runs):
+    """
+    Wavelength and scattering angle grids all `runs` are plotted on.
+
+    Distinct grids are told apart by their fingerprint, if there is more
+    than one of either they are merged with `common_grid`.
+    """
+    grids = []
+    for name, key in [("wavelength", "wavelengths"), ("angle", "scattering_angles")]:
+        distinct = {run[f"{name}_fingerprint"]: run[key] for run in runs}
+        if len(distinct) == 1:
+            grids.append(next(iter(distinct.values())))
+            continue
+        try:
+            grids.append(common_grid(distinct.values()))
+        except ValueError as e:
+            st.error(f"The {name} grids of the selected files can't be combined: {e}")
+            st.stop()
+    return grids
+
+
+def resampled(file, run, wavelengths, scattering_angles):
+    # Interpolated once per file and target grid, runs already on the target
+    # grid are used as they are
+    target = (fingerprint(wavelengths), fingerprint(scattering_angles))
+    if (run["wavelength_fingerprint"], run["angle_fingerprint"]) == target:
+        return run
+    return shared_cache.get_or_load(
+        ("epsc2024", "resampled", file) + target,
+        file_version(file),
+        lambda: resample_run(run, wavelengths, scattering_angles),
+    )
+
+
+def build_ensemble(files, wavelengths, scattering_angles):
+    # Runs are opened one at a time and dropped once they are added, without
+    # going through the cache, so memory does not grow with the number of
+    # files. This runs as a shared cache loader and must not touch the UI
+    ensemble = Ensemble(QUANTITIES)
+    for file in files:
+        run = load_run(open_store(file))
+        ensemble.add(resample_run(run, wavelengths, scattering_angles))
+    return wavelengths, scattering_angles, ensemble
+
+
+def load_ensemble(files):
+    key = ("epsc2024", "ensemble", tuple(files))
+    version = tuple(file_version(file) for file in files)
+    missing = object()
+    ensemble = shared_cache.get(key, version, missing)
+    if ensemble is not missing:
+        return ensemble
+
+    # Conversion progress and grid errors are reported by this session,
+    # before the cache loads the ensemble
+    progress = st.progress(0.0, "Converting files")
+    convert_stale(
+        files,
+        lambda done, total, file: progress.progress(
+            done / total, f"Converted {done}/{total}: {file}"
+        ),
+    )
+    progress.empty()
+    # The grids are memory-mapped, reading all of them first is cheap
+    wavelengths, scattering_angles = target_grids(
+        [load_run(open_store(file)) for file in files]
+    )
+    with st.spinner(f"Adding {len(files)} runs to the ensemble"):
+        return shared_cache.get_or_load(
+            key,
+            version,
+            lambda: build_ensemble(files, wavelengths, scattering_angles),
+        )
+
+
+@st.fragment
+def ensemble_panels(files):
+    wavelengths, scattering_angles, ensemble = load_ensemble(files)
+    scattering_angles = scattering_angles * 180 / np.pi
+    color = (31, 119, 180)
+
+    with timed("Ensemble mixing components", timings):
+        fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.02)
+        for row, name in enumerate(
+            [
+                "scattering_cross_section",
+                "extinction_cross_section",
+                "single_scattering_albedo",
+            ],
+            1,
+        ):
+            fig.add_traces(
+                envelope_traces(
+                    wavelengths / 1e3, ensemble[name], color, showlegend=row == 1
+                ),
+                rows=row,
+                cols=1,
+            )
+        fig.update_layout(
+            title=f"Mixing components of {ensemble.count} runs",
+            height=900,
+            xaxis3=dict(title="Wavelength", ticksuffix="&mu;m"),
+            yaxis1=dict(
+                title="Scattering Cross-section [&mu;m² ]",
+                showexponent="all",
+                exponentformat="e",
+            ),
+            yaxis2=dict(
+                title="Extinction Cross-section [&mu;m²]",
+                showexponent="all",
+                exponentformat="e",
+            ),
+            yaxis3=dict(title="Single-Scattering Albedo"),
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+    idx = st.selectbox(
+        "Wavelength",
+        range(len(wavelengths)),
+        0,
+        lambda idx: f"{wavelengths[idx] / 1e3:.2f}μm",
+    )
+    with timed("Ensemble angles", timings):
+        titles = {
+            "phase_function": "Phase Function p(θ, λ)",
+            "degree_of_linear_polarization": "Degree of linear polarization (θ, λ)",
+            "degree_of_linear_polarization_q": "Degree of linear polarization - Q (θ, λ)",
+            "degree_of_linear_polarization_u": "Degree of linear polarization - U (θ, λ)",
+            "degree_of_circular_polarization": "Degree of circular polarization (θ, λ)",
+        }
+        fig = make_subplots(rows=len(titles), cols=1, shared_xaxes=True)
+        for row, name in enumerate(titles, 1):
+            fig.add_traces(
+                envelope_traces(
+                    scattering_angles,
+                    ensemble[name][:, idx],
+                    color,
+                    showlegend=row == 1,
+                ),
+                rows=row,
+                cols=1,
+            )
+            fig.update_yaxes(title=titles[name], row=row, col=1)
+        fig.update_xaxes(
+            title="Phase Angle",
+            ticksuffix="°",
+            tickmode="linear",
+            tick0=0,
+            dtick=45,
+            row=len(titles),
+            col=1,
+        )
+        fig.update_layout(height=300 * len(titles))
+        st.plotly_chart(fig, use_container_width=True)
+
+
+if ensemble_mode:
+    ensemble_panels(files)
+    st.stop()
 
 scattering_cross_section = {}
 extinction_cross_section = {}
@@ -42,195 +247,295 @@ degree_of_linear_polarization = {}
 degree_of_linear_polarization_q = {}
 degree_of_linear_polarization_u = {}
 degree_of_circular_polarization = {}
+quantities = dict(
+    scattering_cross_section=scattering_cross_section,
+    extinction_cross_section=extinction_cross_section,
+    single_scattering_albedo=single_scattering_albedo,
+    phase_function=phase_function,
+    degree_of_linear_polarization=degree_of_linear_polarization,
+    degree_of_linear_polarization_q=degree_of_linear_polarization_q,
+    degree_of_linear_polarization_u=degree_of_linear_polarization_u,
+    degree_of_circular_polarization=degree_of_circular_polarization,
+)
 
-for file in files:
-    data = bz2.BZ2File(file, "rb")
-    data = _pickle.load(data)
-
-    if wavelengths is None:
-        wavelengths = np.array(data["wavelength"]["value"])
-    else:
-        np.testing.assert_allclose(
-            wavelengths,
-            np.array(data["wavelength"]["value"]),
-            1e-9,
-            0,
-            err_msg="All wavelength arrays need to be the same!",
-        )
+# Loaded runs persist across reruns, so only newly selected (or modified)
+# files are loaded
+runs = st.session_state.setdefault("runs", {})
+for file in list(runs):
+    if file not in files:
+        del runs[file]
+new_files = [
+    file for file in files if file not in runs or runs[file][0] != file_version(file)
+]
 
-    if scattering_angles is None:
-        scattering_angles = np.array(data["angle"]["value"])
-    else:
-        np.testing.assert_allclose(
-            scattering_angles,
-            np.array(data["angle"]["value"]),
-            1e-9,
-            0,
-            err_msg="All scattering angle arrays need to be the same!",
-        )
+# Files without an up-to-date store are converted in parallel first
+progress = st.progress(0.0, "Loading files")
+convert_stale(
+    new_files,
+    lambda done, total, file: progress.progress(
+        done / total, f"Converted {done}/{total}: {file}"
+    ),
+)
+progress.empty()
 
-    scattering_cross_section[file] = (
-        data["wavelength"]["data"]["scattering_cross_section"] * CROSS_SECTION_SCALE**2
-    )
-    extinction_cross_section[file] = (
-        data["wavelength"]["data"]["extinction_cross_section"] * CROSS_SECTION_SCALE**2
+for file in new_files:
+    runs.pop(file, None)
+    runs[file] = (file_version(file), load_run(load_data(file)))
+
+# Runs from different campaigns are interpolated onto a common grid
+wavelengths, scattering_angles = target_grids([runs[file][1] for file in files])
+target = (fingerprint(wavelengths), fingerprint(scattering_angles))
+if any(
+    (runs[file][1]["wavelength_fingerprint"], runs[file][1]["angle_fingerprint"])
+    != target
+    for file in files
+):
+    st.info(
+        f"The selected files use different grids, they are shown interpolated "
+        f"onto {len(wavelengths)} wavelengths and {len(scattering_angles)} "
+        "scattering angles"
     )
-    single_scattering_albedo[file] = data["wavelength"]["data"][
-        "single_scattering_albedo"
-    ]
-    phase_function[file] = data["angle"]["data"]["phase_function"]["normal"]
-    degree_of_linear_polarization[file] = data["angle"]["data"][
-        "degree_of_linear_polarization"
-    ]["normal"]
-    degree_of_linear_polarization_q[file] = data["angle"]["data"][
-        "degree_of_linear_polarization_q"
-    ]["normal"]
-    degree_of_linear_polarization_u[file] = data["angle"]["data"][
-        "degree_of_linear_polarization_u"
-    ]["normal"]
-    degree_of_circular_polarization[file] = data["angle"]["data"][
-        "degree_of_circular_polarization"
-    ]["normal"]
+for file in files:
+    run = resampled(file, runs[file][1], wavelengths, scattering_angles)
+    for name, values in quantities.items():
+        values[file] = run[name]
 scattering_angles = scattering_angles * 180 / np.pi
 
-wavelengths_cbox = []
-with st.sidebar:
-    form = st.form("wavelengths")
-    form.write("Wavelengths")
-    for i, w in enumerate(wavelengths):
-        wavelengths_cbox.append(form.checkbox(f"{w / 1e3:.2f}&mu;m", value=(i == 0)))
-    submit = form.form_submit_button("Submit")
-if not wavelengths_cbox:
-    st.warning("Please select at least one wavelength to display")
-    st.stop()
-
 # Display wavelength stuff
 cmap_delta = 0.1
 cmap = colors.sample_colorscale(
     CMAP_TYPE, np.linspace(CMAP_DELTA, 1 - CMAP_DELTA, len(files))
 )
-fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.02)
-# Scattering Cross-Section
-for idx, file in enumerate(files):
-    name = file.split(os.sep)[-1]
-    fig.add_trace(
-        go.Scatter(
-            x=wavelengths / 1e3,
-            y=scattering_cross_section[file],
-            line=dict(color=cmap[idx]),
-            name="C<sub>sca</sub>",
-            text=file,
-            legendgrouptitle_text=name,
-            legendgroup=file,
-        ),
-        row=1,
-        col=1,
-    )
-    # Extinction Cross-Section
-    fig.add_trace(
-        go.Scatter(
-            x=wavelengths / 1e3,
-            y=extinction_cross_section[file],
-            line=dict(color=cmap[idx]),
-            name="C<sub>ext</sub>",
-            legendgroup=file,
-        ),
-        row=2,
-        col=1,
-    )
-    # Single-Scattering Albedo
-    fig.add_trace(
-        go.Scatter(
-            x=wavelengths / 1e3,
-            y=single_scattering_albedo[file],
-            line=dict(color=cmap[idx]),
-            name="w",
-            legendgroup=file,
-        ),
-        row=3,
-        col=1,
-    )
-
-fig.update_layout(
-    title="Mixing components",
-    height=900,
-    xaxis3=dict(title="Wavelength", ticksuffix="&mu;m"),
-    yaxis1=dict(
-        title="Scattering Cross-section [&mu;m² ]",
-        showexponent="all",
-        exponentformat="e",
-    ),
-    yaxis2=dict(
-        title="Extinction Cross-section [&mu;m²]",
-        showexponent="all",
-        exponentformat="e",
-    ),
-    yaxis3=dict(title="Single-Scattering Albedo"),
-)
-st.plotly_chart(fig, use_container_width=True)
 
-# Plot angle stuff
-# cmap = colors.sample_colorscale(CMAP_TYPE, np.linspace(CMAP_DELTA, 1-CMAP_DELTA, wavelength.size))
-for idx, toggle in enumerate(wavelengths_cbox):
-    if not toggle:
-        continue
 
-    st.header(f"λ = {wavelengths[idx]/1e3:.2f}&mu;m")
-    fig = make_subplots(rows=2, cols=2)
-    for f_idx, file in enumerate(files):
+def mixing_components_figure():
+    trace = scatter_type(3 * len(files) * wavelengths.size)
+    fig = make_subplots(rows=3, cols=1, shared_xaxes=True, vertical_spacing=0.02)
+    # Scattering Cross-Section
+    for idx, file in enumerate(files):
         name = file.split(os.sep)[-1]
         fig.add_trace(
-            go.Scatter(
-                x=scattering_angles,
-                y=phase_function[file][:, idx],
-                line=dict(color=cmap[f_idx]),
-                name="Phase function",
-                text=f"λ = {wavelengths[idx]}",
+            trace(
+                x=wavelengths / 1e3,
+                y=scattering_cross_section[file],
+                line=dict(color=cmap[idx]),
+                name="C<sub>sca</sub>",
+                text=file,
                 legendgrouptitle_text=name,
-                legendgroup=name,
+                legendgroup=file,
             ),
             row=1,
             col=1,
         )
+        # Extinction Cross-Section
         fig.add_trace(
-            go.Scatter(
-                x=scattering_angles,
-                y=degree_of_linear_polarization[file][:, idx],
-                line=dict(color=cmap[f_idx]),
-                name="DoLP",
-                text=f"λ = {wavelengths[idx]}",
-                legendgroup=name,
+            trace(
+                x=wavelengths / 1e3,
+                y=extinction_cross_section[file],
+                line=dict(color=cmap[idx]),
+                name="C<sub>ext</sub>",
+                legendgroup=file,
             ),
-            row=1,
-            col=2,
+            row=2,
+            col=1,
         )
+        # Single-Scattering Albedo
         fig.add_trace(
-            go.Scatter(
-                x=scattering_angles,
-                y=degree_of_linear_polarization_q[file][:, idx],
-                line=dict(color=cmap[f_idx]),
-                name="DoLP Q",
-                text=f"λ = {wavelengths[idx]}",
-                legendgroup=name,
+            trace(
+                x=wavelengths / 1e3,
+                y=single_scattering_albedo[file],
+                line=dict(color=cmap[idx]),
+                name="w",
+                legendgroup=file,
             ),
-            row=2,
+            row=3,
             col=1,
         )
-        fig.add_trace(
-            go.Scatter(
-                x=scattering_angles,
-                y=degree_of_circular_polarization[file][:, idx],
-                line=dict(color=cmap[f_idx]),
-                name="DoCP",
-                text=f"λ = {wavelengths[idx]}",
-                legendgroup=name,
+
+    fig.update_layout(
+        title="Mixing components",
+        height=900,
+        xaxis3=dict(title="Wavelength", ticksuffix="&mu;m"),
+        yaxis1=dict(
+            title="Scattering Cross-section [&mu;m² ]",
+            showexponent="all",
+            exponentformat="e",
+        ),
+        yaxis2=dict(
+            title="Extinction Cross-section [&mu;m²]",
+            showexponent="all",
+            exponentformat="e",
+        ),
+        yaxis3=dict(title="Single-Scattering Albedo"),
+    )
+    return fig
+
+
+with timed("Mixing components", timings):
+    fig = compare_figure(files, "mixing_components", mixing_components_figure)
+    st.plotly_chart(fig, use_container_width=True)
+
+
+# Plot angle stuff
+# cmap = colors.sample_colorscale(CMAP_TYPE, np.linspace(CMAP_DELTA, 1-CMAP_DELTA, wavelength.size))
+@st.fragment
+def wavelength_panels(files, wavelengths, scattering_angles, quantities, cmap):
+    # Selecting wavelengths only reruns this fragment, the file-wide
+    # figures above and below are left as they are
+    phase_function = quantities["phase_function"]
+    degree_of_linear_polarization = quantities["degree_of_linear_polarization"]
+    degree_of_linear_polarization_q = quantities["degree_of_linear_polarization_q"]
+    degree_of_circular_polarization = quantities["degree_of_circular_polarization"]
+
+    def wavelength_figure(idx, webgl):
+        trace = scatter_type(4 * len(files) * scattering_angles.size, webgl)
+        fig = make_subplots(rows=2, cols=2)
+        for f_idx, file in enumerate(files):
+            name = file.split(os.sep)[-1]
+            fig.add_trace(
+                trace(
+                    x=scattering_angles,
+                    y=phase_function[file][:, idx],
+                    line=dict(color=cmap[f_idx]),
+                    name="Phase function",
+                    text=f"λ = {wavelengths[idx]}",
+                    legendgrouptitle_text=name,
+                    legendgroup=name,
+                ),
+                row=1,
+                col=1,
+            )
+            fig.add_trace(
+                trace(
+                    x=scattering_angles,
+                    y=degree_of_linear_polarization[file][:, idx],
+                    line=dict(color=cmap[f_idx]),
+                    name="DoLP",
+                    text=f"λ = {wavelengths[idx]}",
+                    legendgroup=name,
+                ),
+                row=1,
+                col=2,
+            )
+            fig.add_trace(
+                trace(
+                    x=scattering_angles,
+                    y=degree_of_linear_polarization_q[file][:, idx],
+                    line=dict(color=cmap[f_idx]),
+                    name="DoLP Q",
+                    text=f"λ = {wavelengths[idx]}",
+                    legendgroup=name,
+                ),
+                row=2,
+                col=1,
+            )
+            fig.add_trace(
+                trace(
+                    x=scattering_angles,
+                    y=degree_of_circular_polarization[file][:, idx],
+                    line=dict(color=cmap[f_idx]),
+                    name="DoCP",
+                    text=f"λ = {wavelengths[idx]}",
+                    legendgroup=name,
+                ),
+                row=2,
+                col=2,
+            )
+        fig.update_layout(
+            # title="Log-plot and Polar-plot of the " + plot_type,
+            height=800,
+            xaxis1=dict(
+                title="Phase Angle",
+                ticksuffix="°",
+                tickmode="linear",
+                tick0=0,
+                dtick=45,
             ),
-            row=2,
-            col=2,
+            yaxis1=dict(title="Phase Function p(θ, λ)"),
+            xaxis2=dict(
+                title="Phase Angle",
+                ticksuffix="°",
+                tickmode="linear",
+                tick0=0,
+                dtick=45,
+            ),
+            yaxis2=dict(title="Degree of linear polarization (θ, λ)"),
+            xaxis3=dict(
+                title="Phase Angle",
+                ticksuffix="°",
+                tickmode="linear",
+                tick0=0,
+                dtick=45,
+            ),
+            yaxis3=dict(title="Degree of linear polarization - Q (θ, λ)"),
+            xaxis4=dict(
+                title="Phase Angle",
+                ticksuffix="°",
+                tickmode="linear",
+                tick0=0,
+                dtick=45,
+            ),
+            yaxis4=dict(title="Degree of circular polarization (θ, λ)"),
         )
+        return fig
+
+    selected = st.multiselect(
+        "Wavelengths",
+        range(len(wavelengths)),
+        [0],
+        lambda idx: f"{wavelengths[idx] / 1e3:.2f}μm",
+    )
+    if not selected:
+        st.warning("Please select at least one wavelength to display")
+        return
+
+    # Beyond the WebGL budget of the page all wavelengths are drawn as SVG
+    webgl = len(selected) + 3 <= WEBGL_FIGURES
+    with timed("Wavelengths", timings):
+        for idx in selected:
+            st.header(f"λ = {wavelengths[idx]/1e3:.2f}&mu;m")
+            fig = compare_figure(
+                files,
+                ("wavelength", idx, webgl),
+                lambda: wavelength_figure(idx, webgl),
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+
+wavelength_panels(files, wavelengths, scattering_angles, quantities, cmap)
+# The fixed panels show the wavelengths at these indices of the first run's
+# own grid, taken at the nearest wavelength of the (possibly common) grid
+reference = runs[files[0]][1]["wavelengths"]
+manual_idx = [
+    int(np.argmin(np.abs(wavelengths - reference[min(i, reference.size - 1)])))
+    for i in MANUAL_INDICES
+]
+
+
+# Phase function
+def manual_phase_function_figure():
+    trace = scatter_type(3 * len(files) * scattering_angles.size)
+    fig = make_subplots(rows=1, cols=3, shared_xaxes=True, vertical_spacing=0.02)
+    # Scattering Cross-Section
+    for idx, file in enumerate(files):
+        name = file.split(os.sep)[-1]
+        for i, m in enumerate(manual_idx):
+            fig.add_trace(
+                trace(
+                    x=scattering_angles,
+                    y=phase_function[file][:, m],
+                    line=dict(color=cmap[idx]),
+                    name=f"λ = {wavelengths[m] / 1e3}&mu;m",
+                    legendgrouptitle_text=name,
+                    legendgroup=name,
+                ),
+                row=1,
+                col=i + 1,
+            )
+
     fig.update_layout(
-        # title="Log-plot and Polar-plot of the " + plot_type,
-        height=800,
+        # title="Mixing components",
+        height=650,
         xaxis1=dict(
             title="Phase Angle",
             ticksuffix="°",
@@ -238,7 +543,9 @@ for idx, toggle in enumerate(wavelengths_cbox):
             tick0=0,
             dtick=45,
         ),
-        yaxis1=dict(title="Phase Function p(θ, λ)"),
+        yaxis1=dict(
+            title=f"Phase Function p(θ, λ = {wavelengths[manual_idx[0]] / 1e3}&mu;m)"
+        ),
         xaxis2=dict(
             title="Phase Angle",
             ticksuffix="°",
@@ -246,7 +553,9 @@ for idx, toggle in enumerate(wavelengths_cbox):
             tick0=0,
             dtick=45,
         ),
-        yaxis2=dict(title="Degree of linear polarization (θ, λ)"),
+        yaxis2=dict(
+            title=f"Phase Function p(θ, λ = {wavelengths[manual_idx[1]] / 1e3}&mu;m)"
+        ),
         xaxis3=dict(
             title="Phase Angle",
             ticksuffix="°",
@@ -254,120 +563,68 @@ for idx, toggle in enumerate(wavelengths_cbox):
             tick0=0,
             dtick=45,
         ),
-        yaxis3=dict(title="Degree of linear polarization - Q (θ, λ)"),
-        xaxis4=dict(
+        yaxis3=dict(
+            title=f"Phase Function p(θ, λ = {wavelengths[manual_idx[2]] / 1e3}&mu;m)"
+        ),
+    )
+    return fig
+
+
+fig = compare_figure(files, "manual_phase_function", manual_phase_function_figure)
+st.plotly_chart(fig, use_container_width=True)
+
+
+# DoLP
+def manual_dolp_figure():
+    trace = scatter_type(3 * len(files) * scattering_angles.size)
+    fig = make_subplots(rows=1, cols=3, shared_xaxes=True, vertical_spacing=0.02)
+    # Scattering Cross-Section
+    for idx, file in enumerate(files):
+        name = file.split(os.sep)[-1]
+        for i, m in enumerate(manual_idx):
+            fig.add_trace(
+                trace(
+                    x=scattering_angles,
+                    y=degree_of_linear_polarization[file][:, m],
+                    line=dict(color=cmap[idx]),
+                    name=f"λ = {wavelengths[m] / 1e3}&mu;m",
+                    legendgrouptitle_text=name,
+                    legendgroup=name,
+                ),
+                row=1,
+                col=i + 1,
+            )
+
+    fig.update_layout(
+        # title="Mixing components",
+        height=650,
+        xaxis1=dict(
             title="Phase Angle",
             ticksuffix="°",
             tickmode="linear",
             tick0=0,
             dtick=45,
         ),
-        yaxis4=dict(title="Degree of circular polarization (θ, λ)"),
+        yaxis1=dict(title=f"DoLP(θ, λ = {wavelengths[manual_idx[0]] / 1e3}&mu;m)"),
+        xaxis2=dict(
+            title="Phase Angle",
+            ticksuffix="°",
+            tickmode="linear",
+            tick0=0,
+            dtick=45,
+        ),
+        yaxis2=dict(title=f"DoLP(θ, λ = {wavelengths[manual_idx[1]] / 1e3}&mu;m)"),
+        xaxis3=dict(
+            title="Phase Angle",
+            ticksuffix="°",
+            tickmode="linear",
+            tick0=0,
+            dtick=45,
+        ),
+        yaxis3=dict(title=f"DoLP(θ, λ = {wavelengths[manual_idx[2]] / 1e3}&mu;m)"),
     )
-    st.plotly_chart(fig, use_container_width=True)
-
-manual_idx = [1, 6, 11]
-
-# Phase function
-fig = make_subplots(rows=1, cols=3, shared_xaxes=True, vertical_spacing=0.02)
-# Scattering Cross-Section
-for idx, file in enumerate(files):
-    name = file.split(os.sep)[-1]
-    for i, m in enumerate(manual_idx):
-        fig.add_trace(
-            go.Scatter(
-                x=scattering_angles,
-                y=phase_function[file][:, m],
-                line=dict(color=cmap[idx]),
-                name=f"λ = {wavelengths[m] / 1e3}&mu;m",
-                legendgrouptitle_text=name,
-                legendgroup=name,
-            ),
-            row=1,
-            col=i + 1,
-        )
+    return fig
 
-fig.update_layout(
-    # title="Mixing components",
-    height=650,
-    xaxis1=dict(
-        title="Phase Angle",
-        ticksuffix="°",
-        tickmode="linear",
-        tick0=0,
-        dtick=45,
-    ),
-    yaxis1=dict(
-        title=f"Phase Function p(θ, λ = {wavelengths[manual_idx[0]] / 1e3}&mu;m)"
-    ),
-    xaxis2=dict(
-        title="Phase Angle",
-        ticksuffix="°",
-        tickmode="linear",
-        tick0=0,
-        dtick=45,
-    ),
-    yaxis2=dict(
-        title=f"Phase Function p(θ, λ = {wavelengths[manual_idx[1]] / 1e3}&mu;m)"
-    ),
-    xaxis3=dict(
-        title="Phase Angle",
-        ticksuffix="°",
-        tickmode="linear",
-        tick0=0,
-        dtick=45,
-    ),
-    yaxis3=dict(
-        title=f"Phase Function p(θ, λ = {wavelengths[manual_idx[2]] / 1e3}&mu;m)"
-    ),
-)
-st.plotly_chart(fig, use_container_width=True)
-
-# DoLP
-fig = make_subplots(rows=1, cols=3, shared_xaxes=True, vertical_spacing=0.02)
-# Scattering Cross-Section
-for idx, file in enumerate(files):
-    name = file.split(os.sep)[-1]
-    for i, m in enumerate(manual_idx):
-        fig.add_trace(
-            go.Scatter(
-                x=scattering_angles,
-                y=degree_of_linear_polarization[file][:, m],
-                line=dict(color=cmap[idx]),
-                name=f"λ = {wavelengths[m] / 1e3}&mu;m",
-                legendgrouptitle_text=name,
-                legendgroup=name,
-            ),
-            row=1,
-            col=i + 1,
-        )
 
-fig.update_layout(
-    # title="Mixing components",
-    height=650,
-    xaxis1=dict(
-        title="Phase Angle",
-        ticksuffix="°",
-        tickmode="linear",
-        tick0=0,
-        dtick=45,
-    ),
-    yaxis1=dict(title=f"DoLP(θ, λ = {wavelengths[manual_idx[0]] / 1e3}&mu;m)"),
-    xaxis2=dict(
-        title="Phase Angle",
-        ticksuffix="°",
-        tickmode="linear",
-        tick0=0,
-        dtick=45,
-    ),
-    yaxis2=dict(title=f"DoLP(θ, λ = {wavelengths[manual_idx[1]] / 1e3}&mu;m)"),
-    xaxis3=dict(
-        title="Phase Angle",
-        ticksuffix="°",
-        tickmode="linear",
-        tick0=0,
-        dtick=45,
-    ),
-    yaxis3=dict(title=f"DoLP(θ, λ = {wavelengths[manual_idx[2]] / 1e3}&mu;m)"),
-)
+fig = compare_figure(files, "manual_dolp", manual_dolp_figure)
 st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,141 @@
+import numpy as np
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class P2Quantile:
+    """
+    Streaming estimate of the `p` quantile of every element of equally shaped arrays.
+
+    Vectorized P² algorithm (Jain & Chlamtac, 1985): five markers per
+    element are moved towards their desired positions with piecewise
+    parabolic interpolation, so memory does not grow with the number of
+    arrays added. Exact until five arrays have been seen.
+    """
+
+    def __init__(self, p, shape):
+        self.p = p
+        self.count = 0
+        self.heights = np.zeros((5,) + tuple(shape))
+        self.positions = np.broadcast_to(
+            np.arange(1.0, 6.0).reshape((5,) + (1,) * len(shape)), self.heights.shape
+        ).copy()
+        self.desired = np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1])
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float)
+        if self.count < 5:
+            self.heights[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                self.heights.sort(axis=0)
+            return
+        self.count += 1
+        q, n = self.heights, self.positions
+
+        # Extend the outer markers and find the cell of each new value
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        cell = np.sum(x >= q[1:4], axis=0)
+        n += np.arange(5).reshape((5,) + (1,) * x.ndim) > cell
+        desired = (self.desired + (self.count - 5) * self.increments).reshape(
+            (5,) + (1,) * x.ndim
+        )
+
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            move = ((d >= 1) & (n[i + 1] - n[i] > 1)) | (
+                (d <= -1) & (n[i - 1] - n[i] < -1)
+            )
+            if not np.any(move):
+                continue
+            d = np.where(move, np.sign(d), 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                parabolic = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                neighbour = np.where(d > 0, i + 1, i - 1)
+                q_neighbour = np.take_along_axis(q, neighbour[np.newaxis], 0)[0]
+                n_neighbour = np.take_along_axis(n, neighbour[np.newaxis], 0)[0]
+                linear = q[i] + d * (q_neighbour - q[i]) / (n_neighbour - n[i])
+            inside = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            q[i] = np.where(move, np.where(inside, parabolic, linear), q[i])
+            n[i] += d
+
+    @property
+    def value(self):
+        if self.count < 5:
+            return np.quantile(self.heights[: self.count], self.p, axis=0)
+        return self.heights[2].copy()
+
+    def __getitem__(self, index):
+        """Estimate restricted to the elements at `index`."""
+        index = index if isinstance(index, tuple) else (index,)
+        view = P2Quantile.__new__(P2Quantile)
+        vars(view).update(vars(self))
+        view.heights = self.heights[(slice(None),) + index]
+        view.positions = self.positions[(slice(None),) + index]
+        return view
+
+
+class RunningStats:
+    """Count, mean, variance (Welford) and approximate quantiles of a stream of arrays."""
+
+    def __init__(self, shape, quantiles=QUANTILES):
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.quantiles = {p: P2Quantile(p, shape) for p in quantiles}
+
+    def add(self, x):
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        for quantile in self.quantiles.values():
+            quantile.add(x)
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return np.zeros_like(self.mean)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        return np.sqrt(self.variance)
+
+    def quantile(self, p):
+        return self.quantiles[p].value
+
+    def __getitem__(self, index):
+        """Statistics of the elements at `index`, e.g. one wavelength."""
+        view = RunningStats.__new__(RunningStats)
+        view.count = self.count
+        view.mean = self.mean[index]
+        view.m2 = self.m2[index]
+        view.quantiles = {p: q[index] for p, q in self.quantiles.items()}
+        return view
+
+
+class Ensemble:
+    """Running statistics of named quantities, updated one run at a time."""
+
+    def __init__(self, names, quantiles=QUANTILES):
+        self.names = list(names)
+        self.quantiles = quantiles
+        self.stats = {}
+        self.count = 0
+
+    def add(self, run):
+        for name in self.names:
+            if name not in self.stats:
+                self.stats[name] = RunningStats(np.shape(run[name]), self.quantiles)
+            self.stats[name].add(run[name])
+        self.count += 1
+
+    def __getitem__(self, name):
+        return self.stats[name]
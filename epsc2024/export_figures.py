@@ -0,0 +1,179 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+
+from store import open_store
+from runs import CROSS_SECTION_SCALE
+from catalog import Catalog
+from sphere import EqualAreaGrid, levels, log_extent, log_radius
+from figures import (
+    PLOT_TYPES,
+    angular_figure,
+    mixing_components_figure,
+    phase_function_figure,
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batch import FORMATS, format_error, outdated, run, write_figure
+
+DATA_DIR = "epsc2024/out"
+OUTPUT_DIR = "figures/epsc2024"
+FIGURES = ["mixing", "angular", "3d"]
+
+
+def render(path, figure, output, plot_type=None, scale=2):
+    """Build one figure of the run at `path` the way app.py does and write it to `output`."""
+    data = open_store(path)
+    wavelength = np.array(data["wavelength/value"])
+    if figure == "mixing":
+        fig = mixing_components_figure(
+            wavelength,
+            data["wavelength/data/scattering_cross_section"] * CROSS_SECTION_SCALE**2,
+            data["wavelength/data/extinction_cross_section"] * CROSS_SECTION_SCALE**2,
+            data["wavelength/data/single_scattering_albedo"],
+        )
+    else:
+        fig = angular_figure(
+            np.array(data["angle/value"]),
+            wavelength,
+            data[f"angle/data/{PLOT_TYPES[plot_type]['key']}/normal"],
+            plot_type,
+        )
+    return write_figure(fig, output, scale)
+
+
+def render_3d(path, plot_type, outputs, scale=2):
+    """
+    Build the 3D figures of the run at `path` the way app.py does.
+
+    `outputs` maps wavelength indices to the files to write. The grid and
+    the radial range are shared by all wavelengths, so they are computed
+    once for all of them.
+    """
+    data = open_store(path)
+    wavelength = np.array(data["wavelength/value"])
+    options = PLOT_TYPES[plot_type]
+    polar_angles = data["angle/data/polar_angles"]
+    azimuthal_angles = data["angle/data/azimuthal_angles"]
+    three_d = data[f"angle/data/{options['key']}/spatial"]
+    grid = EqualAreaGrid(levels(polar_angles.size)[-1], polar_angles, azimuthal_angles)
+    extent = log_extent(three_d, options["absolute"], polar_angles, azimuthal_angles)
+    for index, output in outputs.items():
+        fig = phase_function_figure(
+            *grid.surface(log_radius(three_d[:, index], options["absolute"])),
+            extent,
+            f"3D representation of the {plot_type}, "
+            f"λ = {wavelength[index] / 1e3:.2f}μm",
+        )
+        write_figure(fig, output, scale)
+    return list(outputs.values())
+
+
+def tasks(path, data_dir, output_dir, figures, plot_types, fmt, scale, due):
+    """
+    (function, arguments) of every figure of the run at `path` for which `due(output)`.
+
+    The 3D figures of a plot type are one task for all wavelengths.
+    """
+    name = os.path.splitext(os.path.relpath(path, data_dir))[0]
+    root = os.path.join(output_dir, name)
+    wavelength = open_store(path)["wavelength/value"]
+    if "mixing" in figures:
+        output = os.path.join(root, f"mixing_components.{fmt}")
+        if due(output):
+            yield render, (path, "mixing", output, None, scale)
+    for plot_type in plot_types:
+        key = PLOT_TYPES[plot_type]["key"]
+        if "angular" in figures:
+            output = os.path.join(root, f"{key}.{fmt}")
+            if due(output):
+                yield render, (path, "angular", output, plot_type, scale)
+        if "3d" in figures:
+            outputs = {
+                i: os.path.join(root, f"{key}_3d", f"{i:03d}_{value:.0f}nm.{fmt}")
+                for i, value in enumerate(wavelength)
+            }
+            outputs = {i: output for i, output in outputs.items() if due(output)}
+            if outputs:
+                yield render_3d, (path, plot_type, outputs, scale)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render the figures of every run and wavelength without Streamlit"
+    )
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR)
+    parser.add_argument(
+        "-f",
+        "--format",
+        default="png",
+        choices=FORMATS,
+        help="png, svg and pdf need kaleido",
+    )
+    parser.add_argument("--figures", nargs="+", default=FIGURES, choices=FIGURES)
+    parser.add_argument(
+        "--plot-types",
+        nargs="+",
+        default=[options["key"] for options in PLOT_TYPES.values()],
+        choices=[options["key"] for options in PLOT_TYPES.values()],
+    )
+    parser.add_argument(
+        "--search", default="", help="Only runs whose path contains this"
+    )
+    parser.add_argument(
+        "--scale", type=float, default=2, help="Pixel density of raster images"
+    )
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="Render up-to-date figures too"
+    )
+    args = parser.parse_args()
+    if error := format_error(args.format):
+        parser.error(error)
+
+    # The catalog scan also converts stale stores, in parallel
+    catalog = Catalog(args.data_dir)
+    catalog.scan()
+    for path, error in catalog.failed().items():
+        print(f"Skipping {path}, it could not be read: {error}")
+    plot_types = [
+        plot_type
+        for plot_type, options in PLOT_TYPES.items()
+        if options["key"] in args.plot_types
+    ]
+    todo, checked = [], []
+
+    def due(output, path):
+        checked.append(output)
+        return args.force or outdated(output, [path])
+
+    for entry in catalog.query(args.search):
+        todo += tasks(
+            entry["path"],
+            args.data_dir,
+            args.output,
+            args.figures,
+            plot_types,
+            args.format,
+            args.scale,
+            lambda output: due(output, entry["path"]),
+        )
+
+    def report(done, total, task, error):
+        function, arguments = task
+        if function is render_3d:
+            target = f"{len(arguments[2])} 3D figures of {arguments[0]}, {arguments[1]}"
+        else:
+            target = arguments[2]
+        print(f"[{done}/{total}] {target}" + (f" failed: {error}" if error else ""))
+
+    count = sum(
+        len(arguments[2]) if function is render_3d else 1
+        for function, arguments in todo
+    )
+    print(f"{count} figures to render, {len(checked) - count} up to date")
+    failed = run(todo, args.processes, report)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,121 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as csv
+import pyarrow.parquet as pq
+
+from store import open_store
+from runs import QUANTITIES, SCALED, load_run
+from catalog import Catalog
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.batch import outdated, run
+
+DATA_DIR = "epsc2024/out"
+OUTPUT_DIR = "tables/epsc2024"
+FORMATS = ["parquet", "csv"]
+# Rows held in memory per run while writing, rounded to whole wavelengths
+CHUNK_ROWS = int(os.environ.get("TABLE_CHUNK_ROWS", 1_000_000))
+
+ANGULAR = [name for name, key in QUANTITIES.items() if key.startswith("angle/")]
+SPECTRAL = [name for name in QUANTITIES if name not in ANGULAR]
+# One row per run, wavelength and scattering angle. Wavelengths in nm,
+# scattering angles in degrees and cross sections in μm², as compare.py shows
+# them, the column names end in the unit
+UNITS = {"wavelength": "nm", "scattering_angle": "deg"}
+UNITS.update((name, "um2") for name in SCALED)
+SCHEMA = pa.schema(
+    [("run", pa.string())]
+    + [
+        (f"{name}_{UNITS[name]}" if name in UNITS else name, pa.float64())
+        for name in ["wavelength", "scattering_angle"] + ANGULAR + SPECTRAL
+    ]
+)
+
+
+def batches(name, data, chunk_rows=CHUNK_ROWS):
+    """Record batches of the run `name` in long format, a few wavelengths each."""
+    values = load_run(data)
+    wavelengths, angles = values["wavelengths"], values["scattering_angles"]
+    step = max(1, chunk_rows // max(1, len(angles)))
+    for start in range(0, len(wavelengths), step):
+        # Angular quantities are (angle, wavelength), only this slice is read
+        chunk = slice(start, start + step)
+        count = len(wavelengths[chunk])
+        columns = [
+            pa.repeat(pa.scalar(name, pa.string()), count * len(angles)),
+            np.repeat(wavelengths[chunk], len(angles)),
+            np.tile(np.degrees(angles), count),
+        ]
+        columns += [np.asarray(values[q][:, chunk], float).T.ravel() for q in ANGULAR]
+        columns += [np.repeat(values[q][chunk], len(angles)) for q in SPECTRAL]
+        yield pa.RecordBatch.from_arrays(columns, schema=SCHEMA)
+
+
+def export(path, name, output, chunk_rows=CHUNK_ROWS):
+    """
+    Write the run at `path` to `output`, Parquet or CSV by its extension.
+
+    Batches are written as they are built, so memory is bounded by
+    `chunk_rows` and not by the size of the run. The file is written next
+    to `output` first and renamed into place.
+    """
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    base, extension = os.path.splitext(output)
+    tmp = f"{base}.{os.getpid()}.tmp{extension}"
+    if extension == ".csv":
+        writer = csv.CSVWriter(tmp, SCHEMA)
+    else:
+        writer = pq.ParquetWriter(tmp, SCHEMA, compression="zstd")
+    rows = 0
+    with writer:
+        for batch in batches(name, open_store(path), chunk_rows):
+            writer.write(batch)
+            rows += batch.num_rows
+    os.replace(tmp, output)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write every run as a long-format table, one file per run"
+    )
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument("-o", "--output", default=OUTPUT_DIR)
+    parser.add_argument("-f", "--format", default="parquet", choices=FORMATS)
+    parser.add_argument(
+        "--search", default="", help="Only runs whose path contains this"
+    )
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("-j", "--processes", type=int, default=None)
+    parser.add_argument(
+        "--force", action="store_true", help="Export up-to-date runs too"
+    )
+    args = parser.parse_args()
+
+    # The catalog scan also converts stale stores, in parallel
+    catalog = Catalog(args.data_dir)
+    catalog.scan()
+    for path, error in catalog.failed().items():
+        print(f"Skipping {path}, it could not be read: {error}")
+    todo, skipped = [], 0
+    for entry in catalog.query(args.search):
+        name = os.path.splitext(os.path.relpath(entry["path"], args.data_dir))[0]
+        output = os.path.join(args.output, f"{name}.{args.format}")
+        if args.force or outdated(output, [entry["path"]]):
+            todo.append((export, (entry["path"], name, output, args.chunk_rows)))
+        else:
+            skipped += 1
+
+    print(f"{len(todo)} runs to export, {skipped} up to date")
+    failed = run(
+        todo,
+        args.processes,
+        lambda done, total, task, error: print(
+            f"[{done}/{total}] {task[1][2]}" + (f" failed: {error}" if error else "")
+        ),
+    )
+    sys.exit(1 if failed else 0)
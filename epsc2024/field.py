@@ -0,0 +1,46 @@
+import numpy as np
+
+# Bytes of the complex field read at once
+CHUNK_BYTES = 64 * 1024**2
+TICKS = 15
+
+
+def ticks(vals_log_min, vals_log_max, count=TICKS):
+    """Colorbar ticks of a log field: positions and labels in linear scale."""
+    eps = np.finfo(float).eps
+    tick_vals_log = np.linspace(vals_log_min, vals_log_max, count)
+    tick_vals = [f"{x:.2e}" for x in np.exp(tick_vals_log) - eps]
+    return tick_vals_log, tick_vals
+
+
+def log_magnitude(scattered_field, chunk_bytes=CHUNK_BYTES):
+    """
+    log(|E| + eps) of a complex field of shape (wavelengths, points, 3) as float32.
+
+    The points are processed in chunks of about `chunk_bytes` of the input,
+    so a memory-mapped field is never loaded as a whole and only chunk-sized
+    temporaries are allocated.
+    """
+    eps = np.finfo(float).eps
+    wavelengths, points = scattered_field.shape[:2]
+    values = np.empty((wavelengths, points), dtype=np.float32)
+    row_bytes = (
+        wavelengths * scattered_field.itemsize * int(np.prod(scattered_field.shape[2:]))
+    )
+    step = max(1, chunk_bytes // max(row_bytes, 1))
+    for start in range(0, points, step):
+        chunk = np.asarray(scattered_field[:, start : start + step])
+        squared = chunk.real**2 + chunk.imag**2 if np.iscomplexobj(chunk) else chunk**2
+        values[:, start : start + step] = np.log(np.sqrt(np.sum(squared, axis=2)) + eps)
+    return values
+
+
+class LogField:
+    """Log field magnitude of all wavelengths, with its range and colorbar ticks."""
+
+    def __init__(self, scattered_field, chunk_bytes=CHUNK_BYTES):
+        self.values = log_magnitude(scattered_field, chunk_bytes)
+        self.values.flags.writeable = False
+        self.min = float(np.min(self.values))
+        self.max = float(np.max(self.values))
+        self.tick_vals_log, self.tick_vals = ticks(self.min, self.max)
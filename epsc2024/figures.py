@@ -0,0 +1,342 @@
+import os
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly import colors
+from plotly.subplots import make_subplots
+
+from field import ticks
+
+length_suffix = "μm"
+# Default cap of the wavelengths animated in the browser
+ANIMATION_MAX_FRAMES = int(os.environ.get("ANIMATION_MAX_FRAMES", 24))
+
+# Angular quantities by label, with the store key below angle/data, whether
+# the 3D plot shows the absolute value and the plotly axis type
+PLOT_TYPES = {
+    "Phase Function": dict(key="phase_function", absolute=False, type="log"),
+    "Linear Polarization": dict(
+        key="degree_of_linear_polarization", absolute=False, type="-"
+    ),
+    "Linear Polarization - Q": dict(
+        key="degree_of_linear_polarization_q", absolute=True, type="-"
+    ),
+    "Linear Polarization - U": dict(
+        key="degree_of_linear_polarization_u", absolute=True, type="-"
+    ),
+    "Circular Polarization": dict(
+        key="degree_of_circular_polarization", absolute=True, type="-"
+    ),
+}
+
+
+def cached_figure(cache, key, version, build):
+    """
+    Figure returned by `build()`, kept in `cache` as it is.
+
+    The figure is shared by every session and rerun and must not be
+    modified. st.plotly_chart only serializes it, which is cheaper than
+    copying it or rebuilding it from JSON.
+    """
+    return cache.get_or_load(key, version, build)
+
+
+def frame_indices(count, max_frames=ANIMATION_MAX_FRAMES):
+    """At most `max_frames` evenly spaced indices out of `count`, first and last included."""
+    return np.unique(
+        np.linspace(0, count - 1, min(count, max_frames)).round().astype(int)
+    )
+
+
+def animate(fig, frames, labels, prefix="λ = "):
+    """
+    Turn `fig` into a client-side animation.
+
+    `frames` holds the trace updates of each frame (a list of traces with
+    only the changing properties set), `labels` their slider labels. The
+    figure's own traces should show the first frame.
+    """
+    options = dict(
+        mode="immediate",
+        frame=dict(duration=0, redraw=True),
+        transition=dict(duration=0),
+    )
+    fig.frames = [
+        go.Frame(data=data, name=label) for data, label in zip(frames, labels)
+    ]
+    fig.update_layout(
+        sliders=[
+            dict(
+                active=0,
+                currentvalue=dict(prefix=prefix),
+                pad=dict(t=30),
+                steps=[
+                    dict(method="animate", label=label, args=[[label], options])
+                    for label in labels
+                ],
+            )
+        ],
+        updatemenus=[
+            dict(
+                type="buttons",
+                showactive=False,
+                x=0,
+                y=0,
+                xanchor="right",
+                yanchor="top",
+                pad=dict(t=30, r=10),
+                buttons=[
+                    dict(
+                        label="▶",
+                        method="animate",
+                        args=[
+                            None,
+                            dict(
+                                options,
+                                frame=dict(duration=300, redraw=True),
+                                fromcurrent=True,
+                            ),
+                        ],
+                    ),
+                    dict(label="❚❚", method="animate", args=[[None], options]),
+                ],
+            )
+        ],
+    )
+    return fig
+
+
+def mixing_components_figure(
+    wavelength,
+    scattering_cross_section,
+    extinction_cross_section,
+    single_scattering_albedo,
+    height=900,
+):
+    fig = make_subplots(rows=1, cols=3, shared_xaxes=True, vertical_spacing=0.02)
+    # Scattering Cross-Section
+    fig.add_trace(
+        go.Scatter(
+            x=wavelength / 1e3,
+            y=scattering_cross_section,
+            name="C<sub>sca</sub>",
+        ),
+        row=1,
+        col=1,
+    )
+    # Extinction Cross-Section
+    fig.add_trace(
+        go.Scatter(
+            x=wavelength / 1e3,
+            y=extinction_cross_section,
+            name="C<sub>ext</sub>",
+        ),
+        row=1,
+        col=2,
+    )
+    # Single-Scattering Albedo
+    fig.add_trace(
+        go.Scatter(x=wavelength / 1e3, y=single_scattering_albedo, name="w"),
+        row=1,
+        col=3,
+    )
+
+    fig.update_layout(
+        title="Mixing components",
+        height=height,
+        xaxis3=dict(title="Wavelength", ticksuffix="&mu;m"),
+        yaxis1=dict(
+            title="Scattering Cross-section",
+            showexponent="all",
+            exponentformat="e",
+        ),
+        yaxis2=dict(
+            title="Extinction Cross-section",
+            showexponent="all",
+            exponentformat="e",
+        ),
+        yaxis3=dict(title="Single-Scattering Albedo"),
+    )
+    return fig
+
+
+def angular_figure(scattering_angles, wavelength, values, plot_type, height=1000):
+    """
+    Log-plot and polar plot of `values` (scattering angle, wavelength), one
+    line per wavelength. `plot_type` is a key of `PLOT_TYPES`.
+    """
+    axis_type = PLOT_TYPES[plot_type]["type"]
+    fig = make_subplots(rows=2, cols=1, specs=[[{"type": "xy"}], [{"type": "polar"}]])
+    cmap = colors.sample_colorscale("Jet", np.linspace(0, 1, wavelength.size))
+    for wavelength_index in range(wavelength.size):
+        fig.add_trace(
+            go.Scatter(
+                x=scattering_angles * 180 / np.pi,
+                y=values[:, wavelength_index],
+                line=dict(color=cmap[wavelength_index]),
+                name="Linear Plot",
+                text=f"λ = {wavelength[wavelength_index]}",
+                legendgrouptitle_text=f"p(θ, {wavelength[wavelength_index]:.2f}nm)",
+                legendgroup=f"group{wavelength_index}",
+            ),
+            row=1,
+            col=1,
+        )
+        fig.add_trace(
+            go.Scatterpolar(
+                theta=np.concatenate(
+                    (scattering_angles, 2 * np.pi - np.flip(scattering_angles))
+                )
+                * 180
+                / np.pi,
+                r=np.concatenate(
+                    (
+                        values[:, wavelength_index],
+                        np.flip(values[:, wavelength_index]),
+                    )
+                ),
+                line=dict(color=cmap[wavelength_index]),
+                name="Polar Plot",
+                legendgroup=f"group{wavelength_index}",
+            ),
+            row=2,
+            col=1,
+        )
+    fig.update_layout(
+        title="Log-plot and Polar-plot of the " + plot_type,
+        height=height,
+        xaxis1=dict(
+            title="Phase Angle",
+            ticksuffix="°",
+            tickmode="linear",
+            tick0=0,
+            dtick=45,
+        ),
+        yaxis1=dict(title=plot_type, type=axis_type),
+        polar=dict(radialaxis=dict(type=axis_type, dtick=1)),
+    )
+    return fig
+
+
+def field_figure(nodes, values, vals_log_min, vals_log_max, tick_vals=None, height=800):
+    """
+    Volume rendering of the log field magnitude `values` at `nodes`.
+
+    `tick_vals` are precomputed colorbar ticks as returned by `field.ticks`.
+    """
+    tick_vals_log, tick_vals = tick_vals or ticks(vals_log_min, vals_log_max)
+
+    fig = go.Figure(
+        data=go.Volume(
+            x=nodes[:, 0],
+            y=nodes[:, 1],
+            z=nodes[:, 2],
+            value=values,
+            isomin=vals_log_min,
+            isomax=vals_log_max,
+            opacity=0.1,  # needs to be small to see through all surfaces
+            surface_count=15,  # needs to be a large number for good volume rendering
+            colorscale="jet",
+            colorbar=dict(
+                tickvals=tick_vals_log,
+                ticktext=tick_vals,
+            ),
+        )
+    )
+    fig.update_layout(
+        height=height,
+        title="Electric Field",
+        scene=dict(
+            xaxis=dict(ticksuffix=length_suffix),
+            yaxis=dict(ticksuffix=length_suffix),
+            zaxis=dict(ticksuffix=length_suffix),
+        ),
+    )
+    return fig
+
+
+def phase_function_figure(vertices, colors, extent, title, height=800):
+    """
+    Closed surface of a quantity over the sphere, `vertices` of shape (rows, cols, 3).
+
+    `extent` holds the lower and upper corner of the axis ranges.
+    """
+    vertices = vertices.astype(np.float32)
+    fig = go.Figure(
+        go.Surface(
+            x=vertices[..., 0],
+            y=vertices[..., 1],
+            z=vertices[..., 2],
+            surfacecolor=colors.astype(np.float32),
+            colorscale="Jet",
+        )
+    )
+    low, high = extent
+    fig.update_layout(
+        title=title,
+        height=height,
+        scene=dict(
+            xaxis=dict(range=[low[0], high[0]], showticklabels=False),
+            yaxis=dict(range=[low[1], high[1]], showticklabels=False),
+            zaxis=dict(range=[low[2], high[2]], showticklabels=False),
+            aspectratio=dict(x=1, y=1, z=1),
+        ),
+    )
+    return fig
+
+
+def envelope_traces(x, stats, color, showlegend=True, **kwargs):
+    """
+    Shaded envelope of `RunningStats` over `x`.
+
+    5-95 % and 25-75 % quantile bands, the mean and mean ± std as dotted
+    lines, drawn in `color`, an (r, g, b) tuple. The number of traces does
+    not depend on the number of runs.
+    """
+    rgb = ",".join(str(c) for c in color)
+    traces = []
+    for low, high, alpha in ((0.05, 0.95, 0.15), (0.25, 0.75, 0.3)):
+        traces.append(
+            go.Scatter(
+                x=x,
+                y=stats.quantile(low),
+                line=dict(width=0),
+                showlegend=False,
+                hoverinfo="skip",
+                **kwargs,
+            )
+        )
+        traces.append(
+            go.Scatter(
+                x=x,
+                y=stats.quantile(high),
+                line=dict(width=0),
+                fill="tonexty",
+                fillcolor=f"rgba({rgb},{alpha})",
+                name=f"{low:.0%} - {high:.0%}",
+                showlegend=showlegend,
+                **kwargs,
+            )
+        )
+    for sign in (-1, 1):
+        traces.append(
+            go.Scatter(
+                x=x,
+                y=stats.mean + sign * stats.std,
+                line=dict(color=f"rgb({rgb})", dash="dot", width=1),
+                name="mean ± std",
+                showlegend=showlegend and sign > 0,
+                **kwargs,
+            )
+        )
+    traces.append(
+        go.Scatter(
+            x=x,
+            y=stats.mean,
+            line=dict(color=f"rgb({rgb})"),
+            name=f"mean of {stats.count} runs",
+            showlegend=showlegend,
+            **kwargs,
+        )
+    )
+    return traces
@@ -0,0 +1,71 @@
+import hashlib
+
+import numpy as np
+
+# Grids that agree to this many significant digits are the same grid
+DIGITS = 9
+
+
+def fingerprint(grid, digits=DIGITS):
+    """
+    Hash of `grid` rounded to `digits` significant digits.
+
+    Computed once per file, after that two grids are compared by comparing
+    their fingerprints instead of element by element.
+    """
+    grid = np.asarray(grid, dtype=float)
+    scale = np.max(np.abs(grid)) if grid.size else 0.0
+    # Adding 0.0 turns -0.0 into 0.0, which would otherwise hash differently
+    rounded = np.round(grid / (scale or 1.0), digits) + 0.0
+    digest = hashlib.blake2b(
+        f"{grid.shape} {scale:.{digits}e}".encode(), digest_size=16
+    )
+    digest.update(rounded.tobytes())
+    return digest.hexdigest()
+
+
+def common_grid(grids, digits=DIGITS):
+    """
+    Union of the points of `grids` within the range covered by all of them.
+
+    Every point of every grid is kept, so files already on a fine grid are
+    not smoothed, points closer than the fingerprint precision are merged.
+    """
+    grids = [np.asarray(grid, dtype=float) for grid in grids]
+    low = max(grid.min() for grid in grids)
+    high = min(grid.max() for grid in grids)
+    if low > high:
+        raise ValueError(f"The grids do not overlap ({low} > {high})")
+    points = np.sort(np.concatenate(grids))
+    points = points[(points >= low) & (points <= high)]
+    tolerance = np.max(np.abs(points)) * 10.0**-digits
+    keep = np.concatenate([[True], np.diff(points) > tolerance])
+    return points[keep]
+
+
+def interpolate(values, grid, target, axis=0):
+    """
+    Linear interpolation of `values` from `grid` onto `target` along `axis`.
+
+    Bracketing indices and weights are computed once for the whole axis,
+    all other axes are interpolated in one go. `target` has to lie within
+    the range of `grid`.
+    """
+    values = np.asarray(values)
+    grid = np.asarray(grid, dtype=float)
+    order = np.argsort(grid, kind="stable")
+    grid = grid[order]
+    values = np.take(values, order, axis=axis)
+    if len(grid) == 1:
+        return np.take(values, np.zeros(len(target), dtype=np.intp), axis=axis)
+
+    right = np.clip(np.searchsorted(grid, target), 1, len(grid) - 1)
+    left = right - 1
+    weight = (target - grid[left]) / (grid[right] - grid[left])
+    shape = [1] * values.ndim
+    shape[axis] = -1
+    weight = weight.reshape(shape)
+    return (
+        np.take(values, left, axis=axis) * (1 - weight)
+        + np.take(values, right, axis=axis) * weight
+    )
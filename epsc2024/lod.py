@@ -0,0 +1,115 @@
+import os
+
+import numpy as np
+
+POINT_BUDGET = int(os.environ.get("FIELD_POINT_BUDGET", 32768))
+MIN_POINTS = 512
+# Points between two levels, halves the grid spacing along every axis
+REFINEMENT = 8
+
+
+def grid_shape(points, budget):
+    """
+    Shape of a regular grid over the bounding box of `points` with at most `budget` nodes.
+
+    Cells are about cubic. Starting from the rounded down node counts, axes
+    are refined one node at a time, the one furthest below its ideal count
+    first, as long as the grid stays within `budget`.
+    """
+    extent = np.ptp(points, axis=0)
+    active = extent > 0
+    if not np.any(active):
+        return (1,) * points.shape[1]
+    spacing = (np.prod(extent[active]) / budget) ** (1 / np.sum(active))
+    ideal = np.where(active, extent / spacing, 1)
+    # Never finer than the sampling along the axis
+    limit = [
+        np.unique(points[:, axis]).size if active[axis] else 1
+        for axis in range(points.shape[1])
+    ]
+    shape = [int(max(1, min(n, np.floor(x)))) for n, x in zip(limit, ideal)]
+    while True:
+        for axis in np.argsort(np.array(shape) / ideal):
+            grown = np.prod(shape) // shape[axis] * (shape[axis] + 1)
+            if shape[axis] < limit[axis] and grown <= budget:
+                shape[axis] += 1
+                break
+        else:
+            return tuple(shape)
+
+
+def grid_nodes(points, shape):
+    """Cell centers of the grid of `shape` over the bounding box of `points`, in C order."""
+    low = np.min(points, axis=0)
+    extent = np.ptp(points, axis=0)
+    axes = [low[i] + (np.arange(n) + 0.5) * extent[i] / n for i, n in enumerate(shape)]
+    return np.stack([x.ravel() for x in np.meshgrid(*axes, indexing="ij")], axis=1)
+
+
+def cell_index(points, shape):
+    """Flat index of the grid cell containing each point."""
+    low = np.min(points, axis=0)
+    extent = np.ptp(points, axis=0)
+    cells = np.floor((points - low) / np.where(extent > 0, extent, 1) * shape)
+    cells = np.minimum(cells.astype(np.intp), np.array(shape) - 1)
+    return np.ravel_multi_index(cells.T, shape)
+
+
+class FieldLOD:
+    """
+    Field sampled at scattered points, resampled onto regular grids of increasing resolution.
+
+    `values` has the wavelengths first. Levels go from coarse to fine, each
+    one has about `REFINEMENT` times the points of the previous one and the
+    finest one stays within `budget`. If all points fit into the budget, the
+    finest level is the original sampling. Grid cells average the values of
+    the points they contain.
+    """
+
+    def __init__(self, points, values, budget=POINT_BUDGET):
+        self.points = np.asarray(points)
+        self.values = np.asarray(values)
+        self.budget = budget
+
+        budgets = [min(budget, len(self.points))]
+        while budgets[-1] // REFINEMENT >= MIN_POINTS:
+            budgets.append(budgets[-1] // REFINEMENT)
+
+        self.levels = []
+        shapes = set()
+        for level_budget in reversed(budgets):
+            if level_budget == len(self.points):
+                self.levels.append(dict(nodes=self.points, index=None, counts=None))
+                continue
+            shape = grid_shape(self.points, level_budget)
+            if shape in shapes:
+                continue
+            shapes.add(shape)
+            index = cell_index(self.points, shape)
+            self.levels.append(
+                dict(
+                    nodes=grid_nodes(self.points, shape),
+                    index=index,
+                    counts=np.bincount(index, minlength=np.prod(shape)),
+                )
+            )
+
+    def __len__(self):
+        return len(self.levels)
+
+    def size(self, level):
+        return len(self.levels[level]["nodes"])
+
+    def level(self, level, wavelength):
+        """Nodes and values of `level` at the `wavelength` index."""
+        level = self.levels[level]
+        values = self.values[wavelength]
+        if level["index"] is None:
+            return level["nodes"], values
+        sums = np.bincount(
+            level["index"], weights=values, minlength=len(level["counts"])
+        )
+        # Cells without a sampling point get the lowest value, so they stay see-through
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(level["counts"] > 0, sums / level["counts"], np.min(values))
+        return level["nodes"], mean
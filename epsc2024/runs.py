@@ -0,0 +1,121 @@
+import os
+import multiprocessing
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from store import convert, is_current
+from grids import fingerprint, interpolate
+
+CROSS_SECTION_SCALE = 1e6
+
+# Quantities compare.py reads from every run, by store key
+QUANTITIES = {
+    "scattering_cross_section": "wavelength/data/scattering_cross_section",
+    "extinction_cross_section": "wavelength/data/extinction_cross_section",
+    "single_scattering_albedo": "wavelength/data/single_scattering_albedo",
+    "phase_function": "angle/data/phase_function/normal",
+    "degree_of_linear_polarization": "angle/data/degree_of_linear_polarization/normal",
+    "degree_of_linear_polarization_q": "angle/data/degree_of_linear_polarization_q/normal",
+    "degree_of_linear_polarization_u": "angle/data/degree_of_linear_polarization_u/normal",
+    "degree_of_circular_polarization": "angle/data/degree_of_circular_polarization/normal",
+}
+SCALED = ["scattering_cross_section", "extinction_cross_section"]
+
+_executor = None
+
+
+def get_executor():
+    # Spawned workers are safe to start from Streamlit's threaded server
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def convert_stale(paths, progress=None, failed=None):
+    """Convert all files without an up-to-date store, in parallel.
+
+    `progress(done, total, path)` is called after each finished file. If
+    `failed` is a dict, files that can't be converted, e.g. truncated ones,
+    are added to it with their error and the others are still converted.
+    Otherwise the first error is raised.
+    """
+    stale = [path for path in paths if not is_current(path)]
+
+    def finished(done, path, error):
+        if isinstance(error, BrokenExecutor):
+            # Not the file's fault, the next call starts a new pool
+            global _executor
+            _executor = None
+            raise error
+        if error is not None:
+            if failed is None:
+                raise error
+            failed[path] = error
+        if progress is not None:
+            progress(done, len(stale), path)
+
+    if len(stale) == 1:
+        error = None
+        try:
+            convert(stale[0])
+        except Exception as e:
+            error = e
+        finished(1, stale[0], error)
+        return stale
+
+    futures = {get_executor().submit(convert, path): path for path in stale}
+    for done, future in enumerate(as_completed(futures), 1):
+        finished(done, futures[future], future.exception())
+    return stale
+
+
+def load_run(data):
+    """Grids and per-file quantities of an opened store."""
+    run = dict(
+        wavelengths=np.array(data["wavelength/value"]),
+        scattering_angles=np.array(data["angle/value"]),
+    )
+    run["wavelength_fingerprint"] = fingerprint(run["wavelengths"])
+    run["angle_fingerprint"] = fingerprint(run["scattering_angles"])
+    for name, key in QUANTITIES.items():
+        run[name] = data[key]
+    for name in SCALED:
+        run[name] = run[name] * CROSS_SECTION_SCALE**2
+    return run
+
+
+def resample_run(run, wavelengths, scattering_angles):
+    """
+    Quantities of `run` (see `load_run`) on the given grids.
+
+    Axes whose grid already has the same fingerprint as the target are
+    passed through without interpolating.
+    """
+    same_wavelengths = run["wavelength_fingerprint"] == fingerprint(wavelengths)
+    same_angles = run["angle_fingerprint"] == fingerprint(scattering_angles)
+    resampled = dict(
+        run,
+        wavelengths=wavelengths,
+        scattering_angles=scattering_angles,
+        wavelength_fingerprint=fingerprint(wavelengths),
+        angle_fingerprint=fingerprint(scattering_angles),
+    )
+    for name, key in QUANTITIES.items():
+        values = run[name]
+        if key.startswith("angle/"):
+            # (scattering angle, wavelength)
+            if not same_angles:
+                values = interpolate(
+                    values, run["scattering_angles"], scattering_angles, axis=0
+                )
+            if not same_wavelengths:
+                values = interpolate(values, run["wavelengths"], wavelengths, axis=1)
+        elif not same_wavelengths:
+            values = interpolate(values, run["wavelengths"], wavelengths, axis=0)
+        resampled[name] = values
+    return resampled
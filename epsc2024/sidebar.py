@@ -0,0 +1,53 @@
+import streamlit as st
+
+from catalog import Catalog
+
+# Label, catalog columns bounded by the slider and the slider format
+FILTERS = [
+    ("Wavelengths [nm]", ["wavelength_min", "wavelength_max"], "%.0f"),
+    ("Scattering angles", ["angle_count"], "%d"),
+    ("Particles", ["particle_count"], "%d"),
+    ("Particle radii", ["radius_min", "radius_max"], "%.3g"),
+    ("Field points", ["field_points"], "%d"),
+]
+
+
+def catalog_runs(data_dir):
+    """
+    Runs of the catalog of `data_dir` that pass the search and filters.
+
+    Renders a search box, a range slider per attribute and a rescan button
+    into the current container. The catalog is rescanned when it is older
+    than `catalog.RESCAN_SECONDS` or on request. New files are listed right
+    away and described in the background.
+    """
+    catalog = Catalog(data_dir)
+    if st.button("Rescan files", help="Index new and changed result files now"):
+        catalog.scan_in_background()
+    else:
+        catalog.scan_if_due(background=True)
+    pending = len(catalog.pending())
+    if pending:
+        st.caption(
+            f"Indexing {pending} new or changed files, no filter applies to them yet"
+        )
+    failed = catalog.failed()
+    if failed:
+        st.caption(
+            f"{len(failed)} files could not be read and are left out",
+            help="\n\n".join(f"{path}: {error}" for path, error in failed.items()),
+        )
+
+    search = st.text_input("Search", placeholder="Part of the file path")
+    ranges = catalog.ranges()
+    filters = {}
+    with st.expander("Filter runs"):
+        for label, columns, fmt in FILTERS:
+            low = ranges[columns[0]][0]
+            high = ranges[columns[-1]][1]
+            if low is None or low == high:
+                continue
+            value = st.slider(label, low, high, (low, high), format=fmt)
+            for column in columns:
+                filters[column] = value
+    return catalog.query(search, **filters)
@@ -0,0 +1,64 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class ParticleIndex:
+    """
+    Spatial index over the particles of an aggregate, centered on their mean position.
+
+    A KD-tree answers sphere, nearest-particle and neighbour queries, the
+    positions sorted along each axis answer slab queries. All queries return
+    particle indices (sorted) into `position` and `radii`.
+    """
+
+    def __init__(self, position, radii):
+        position = np.asarray(position, dtype=float)
+        self.position = position - np.mean(position, axis=0)
+        self.radii = np.asarray(radii, dtype=float)
+        self.tree = cKDTree(self.position)
+        self._order = np.argsort(self.position, axis=0, kind="stable")
+        self._sorted = np.take_along_axis(self.position, self._order, axis=0)
+
+    def __len__(self):
+        return len(self.position)
+
+    @property
+    def bounds(self):
+        return self._sorted[0], self._sorted[-1]
+
+    def slab(self, axis, low, high):
+        """Particles with their center between `low` and `high` along `axis`."""
+        start = np.searchsorted(self._sorted[:, axis], low, side="left")
+        stop = np.searchsorted(self._sorted[:, axis], high, side="right")
+        return np.sort(self._order[start:stop, axis])
+
+    def sphere(self, center, radius):
+        """Particles with their center within `radius` of `center`."""
+        return np.sort(
+            np.asarray(self.tree.query_ball_point(center, radius), dtype=np.intp)
+        )
+
+    def nearest(self, point, k=1):
+        """Distances to and indices of the `k` particles closest to `point`."""
+        return self.tree.query(point, k)
+
+    def neighbour_counts(self, radius, indices=None):
+        """Number of other particles within `radius` of each particle (of `indices`)."""
+        position = self.position if indices is None else self.position[indices]
+        return self.tree.query_ball_point(position, radius, return_length=True) - 1
+
+    def packing_density(self, radius, indices=None):
+        """
+        Local volume fraction around each particle (of `indices`).
+
+        Volume of the particles centered within `radius`, itself included,
+        over the volume of the sphere of `radius`, which has to be positive.
+        """
+        if radius <= 0:
+            raise ValueError(f"neighbourhood radius must be positive, got {radius}")
+        position = self.position if indices is None else self.position[indices]
+        neighbours = self.tree.query_ball_point(position, radius)
+        counts = np.array([len(x) for x in neighbours])
+        volumes = self.radii[np.concatenate(neighbours).astype(np.intp)] ** 3
+        sums = np.add.reduceat(volumes, np.concatenate([[0], np.cumsum(counts)[:-1]]))
+        return sums / radius**3
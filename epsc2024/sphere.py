@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Upper bound of the serialized surface sent to the browser
+PAYLOAD_BUDGET = int(os.environ.get("PHASE_FUNCTION_PAYLOAD_KB", 512)) * 1024
+# x, y, z and color per vertex as base64 encoded float32, with some margin
+# for the JSON around them (about 29 bytes measured)
+BYTES_PER_VERTEX = 32
+
+
+def unit_vectors(polar, azimuthal):
+    return np.stack(
+        [
+            np.sin(polar) * np.cos(azimuthal),
+            np.sin(polar) * np.sin(azimuthal),
+            np.cos(polar),
+        ],
+        axis=-1,
+    )
+
+
+def log_radius(values, absolute=False):
+    """Radius the 3D plots give `values`, log(|values| + 1) or log(values + 1)."""
+    return np.log((np.abs(values) if absolute else values) + 1)
+
+
+def log_extent(three_d, absolute, polar, azimuthal):
+    """
+    Corners of the box around the 3D plot of `three_d` (samples, wavelengths).
+
+    Fits the largest value over all wavelengths, so the axis ranges stay
+    fixed from one wavelength to the next.
+    """
+    peak = np.max(np.abs(three_d) if absolute else three_d, axis=1)
+    points = unit_vectors(polar, azimuthal) * log_radius(peak)[:, np.newaxis]
+    return np.min(points, axis=0), np.max(points, axis=0)
+
+
+def vertex_count(rings):
+    # Cell centers, one pole row at each end and the seam column repeated
+    return (rings + 2) * (2 * rings + 1)
+
+
+def levels(samples, budget=PAYLOAD_BUDGET):
+    """
+    Ring counts of the grid levels that fit into the payload `budget`.
+
+    Every level doubles the rings of the previous one, levels with more
+    cells than `samples` would mostly be filled up and are left out.
+    """
+    rings = [2]
+    while (
+        vertex_count(rings[-1] * 2) * BYTES_PER_VERTEX <= budget
+        and 2 * (rings[-1] * 2) ** 2 <= samples
+    ):
+        rings.append(rings[-1] * 2)
+    return rings
+
+
+class EqualAreaGrid:
+    """
+    Equal-area grid on the unit sphere with `rings` bands and twice as many sectors.
+
+    Band edges are equally spaced in cos(polar), which makes all cells of
+    the same area. Samples at (polar, azimuthal) are averaged per cell,
+    cells without a sample take the value of the closest cell that has one.
+    """
+
+    def __init__(self, rings, polar, azimuthal):
+        self.rings = rings
+        self.sectors = 2 * rings
+        ring = np.floor((1 - np.cos(polar)) / 2 * rings).astype(np.intp)
+        sector = np.floor(np.mod(azimuthal, 2 * np.pi) / (2 * np.pi) * self.sectors)
+        ring = np.clip(ring, 0, rings - 1)
+        sector = np.clip(sector.astype(np.intp), 0, self.sectors - 1)
+        self.cells = ring * self.sectors + sector
+        self.counts = np.bincount(self.cells, minlength=rings * self.sectors)
+
+        cos_polar = 1 - (np.arange(rings) + 0.5) * 2 / rings
+        self.polar = np.arccos(cos_polar)
+        self.azimuthal = (np.arange(self.sectors) + 0.5) * 2 * np.pi / self.sectors
+        centers = unit_vectors(*np.meshgrid(self.polar, self.azimuthal, indexing="ij"))
+        centers = centers.reshape(-1, 3)
+
+        filled = np.flatnonzero(self.counts)
+        _, nearest = cKDTree(centers[filled]).query(centers)
+        self.source = filled[nearest]
+
+    def resample(self, values):
+        """Cell means of `values` given at the samples, shape (rings, sectors)."""
+        sums = np.bincount(self.cells, weights=values, minlength=len(self.counts))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / self.counts
+        return means[self.source].reshape(self.rings, self.sectors)
+
+    def surface(self, values):
+        """
+        Vertices (rings + 2, sectors + 1, 3) and colors of a closed surface.
+
+        The radius of each cell center is `values`, the poles get the mean of
+        the adjacent ring and the first sector is repeated to close the seam.
+        """
+        grid = self.resample(values)
+        grid = np.vstack([grid[:1].mean(keepdims=True).repeat(self.sectors, 1), grid])
+        grid = np.vstack([grid, grid[-1:].mean(keepdims=True).repeat(self.sectors, 1)])
+        grid = np.hstack([grid, grid[:, :1]])
+        polar = np.concatenate([[0], self.polar, [np.pi]])
+        azimuthal = np.concatenate([self.azimuthal, self.azimuthal[:1]])
+        directions = unit_vectors(*np.meshgrid(polar, azimuthal, indexing="ij"))
+        return directions * grid[..., np.newaxis], grid
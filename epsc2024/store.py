@@ -0,0 +1,159 @@
+import os
+import bz2
+import json
+import shutil
+import _pickle
+import argparse
+import tempfile
+from glob import glob
+
+import numpy as np
+
+DATA_DIR = "epsc2024/out"
+EXTENSION = "pbz2"
+STORE_SUFFIX = ".store"
+INDEX_FILE = "index.json"
+
+
+def store_path(path):
+    return os.path.splitext(path)[0] + STORE_SUFFIX
+
+
+def _flatten(tree, prefix=""):
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name + "/")
+        else:
+            yield name, value
+
+
+def _array_file(root, key):
+    return os.path.join(root, *key.split("/")) + ".npy"
+
+
+def is_current(path):
+    """Whether the store next to `path` exists and matches the pickle's mtime."""
+    try:
+        with open(os.path.join(store_path(path), INDEX_FILE)) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return index.get("mtime") == os.path.getmtime(path)
+
+
+def convert(path):
+    """Unpickle `path` once and write every leaf as its own .npy file.
+
+    The store is written to a temporary directory first and renamed into
+    place, so readers never see a half-written layout.
+    """
+    target = store_path(path)
+    mtime = os.path.getmtime(path)
+    with bz2.BZ2File(path, "rb") as f:
+        data = _pickle.load(f)
+
+    tmp = tempfile.mkdtemp(prefix=".convert-", dir=os.path.dirname(target) or ".")
+    keys = {}
+    for key, value in _flatten(data):
+        array = np.asarray(value)
+        file = _array_file(tmp, key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        np.save(file, array, allow_pickle=array.dtype.hasobject)
+        keys[key] = dict(shape=list(array.shape), dtype=array.dtype.str)
+    with open(os.path.join(tmp, INDEX_FILE), "w") as f:
+        json.dump(dict(source=os.path.basename(path), mtime=mtime, keys=keys), f)
+
+    # The old store is moved aside rather than deleted first, so there is
+    # only a rename between it and the new one for concurrent readers
+    old = None
+    if os.path.isdir(target):
+        old = tempfile.mkdtemp(prefix=".old-", dir=os.path.dirname(target) or ".")
+        try:
+            os.replace(target, old)
+        except OSError:
+            # Another conversion already moved it
+            pass
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # A concurrent conversion of the same file got there first
+        shutil.rmtree(tmp, ignore_errors=True)
+    if old is not None:
+        shutil.rmtree(old, ignore_errors=True)
+    return target
+
+
+class Store:
+    """Read-only view of a converted result file.
+
+    Arrays are addressed by their slash-separated key path, e.g.
+    `wavelength/data/scattering_cross_section`, and memory-mapped on first
+    access, so only the keys that are actually read ever touch the disk.
+    Object and empty arrays, which can't be mapped, are read on opening.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self._arrays = {}
+        # Arrays that can't be memory-mapped are read right away, so a cache
+        # measuring the store sees all the memory it will ever hold on to
+        for key in self.keys():
+            if not self._mappable(key):
+                self[key]
+
+    def keys(self):
+        return self.index["keys"].keys()
+
+    def __contains__(self, key):
+        return key in self.index["keys"]
+
+    def shape(self, key):
+        return tuple(self.index["keys"][key]["shape"])
+
+    def dtype(self, key):
+        return np.dtype(self.index["keys"][key]["dtype"])
+
+    def _mappable(self, key):
+        return not self.dtype(key).hasobject and np.prod(self.shape(key)) > 0
+
+    def __getitem__(self, key):
+        if key not in self._arrays:
+            if key not in self:
+                raise KeyError(key)
+            self._arrays[key] = np.load(
+                _array_file(self.path, key),
+                mmap_mode="r" if self._mappable(key) else None,
+                allow_pickle=self.dtype(key).hasobject,
+            )
+        return self._arrays[key]
+
+
+def open_store(path):
+    """Open the store for the .pbz2 file `path`, converting it if needed."""
+    if not is_current(path):
+        convert(path)
+    return Store(store_path(path))
+
+
+def load(path, keys):
+    store = open_store(path)
+    return {key: store[key] for key in keys}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=f"Convert .{EXTENSION} result files into memory-mappable stores"
+    )
+    parser.add_argument("data_dir", nargs="?", default=DATA_DIR)
+    parser.add_argument(
+        "--force", action="store_true", help="Convert up-to-date files too"
+    )
+    args = parser.parse_args()
+
+    for file in sorted(glob(f"{args.data_dir}/**/*.{EXTENSION}", recursive=True)):
+        if args.force or not is_current(file):
+            print(f"Converting {file}")
+            convert(file)
@@ -0,0 +1,225 @@
+import io
+import os
+import sys
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+import requests
+from astropy.io import fits
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'epsc2023'))
+from downloads import DiskCache
+from fits_reader import RemoteFITS
+
+
+class Server(ThreadingHTTPServer):
+    '''
+    Local stand-in for the data server, serving `files` with an ETag per version.
+
+    Byte ranges are honoured unless `ranges` is off, ETags are left out
+    when `etags` is off.
+    '''
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), Handler)
+        self.files = {}
+        self.requests = []
+        self.fail = False
+        self.ranges = True
+        self.etags = True
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def publish(self, name, body):
+        version = self.files.get(name, (None, 0))[1] + 1
+        self.files[name] = (body, version)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append((self.path, dict(self.headers)))
+        if self.server.fail:
+            self.send_error(503)
+            return
+        if self.path[1:] not in self.server.files:
+            self.send_error(404)
+            return
+        body, version = self.server.files[self.path[1:]]
+        etag = f'"v{version}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        start, stop = 0, len(body)
+        ranged = self.server.ranges and 'Range' in self.headers and self.headers.get('If-Range', etag) == etag
+        if ranged:
+            first, last = self.headers['Range'].removeprefix('bytes=').split('-')
+            start, stop = int(first), min(int(last) + 1, len(body))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{stop - 1}/{len(body)}')
+        else:
+            self.send_response(200)
+        if self.server.etags:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(stop - start))
+        self.end_headers()
+        self.wfile.write(body[start:stop])
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def fits_file(seed):
+    '''FITS file with a 3x64x64 `dolp` cube of random values, the same size for every seed.'''
+    cube = np.random.default_rng(seed).random((3, 64, 64)).astype('>f4')
+    hdul = fits.HDUList([fits.PrimaryHDU(), fits.ImageHDU(cube, name='dolp')])
+    buffer = io.BytesIO()
+    hdul.writeto(buffer)
+    return cube, buffer.getvalue()
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_fetch_downloads_once_within_max_age(server, tmp_path):
+    server.publish('a.fits', b'first')
+    cache = DiskCache(str(tmp_path), max_age=60)
+    assert read(cache.fetch(f'{server.url}/a.fits')) == b'first'
+    assert read(cache.fetch(f'{server.url}/a.fits')) == b'first'
+    assert len(server.requests) == 1
+
+
+def test_revalidation_with_304_keeps_the_copy(server, tmp_path):
+    server.publish('a.fits', b'first')
+    cache = DiskCache(str(tmp_path), max_age=0)
+    path = cache.fetch(f'{server.url}/a.fits')
+    mtime = os.stat(path).st_mtime_ns
+    assert cache.fetch(f'{server.url}/a.fits') == path
+    assert server.requests[1][1]['If-None-Match'] == '"v1"'
+    assert os.stat(path).st_mtime_ns == mtime
+    assert read(path) == b'first'
+
+
+def test_changed_file_is_downloaded_again(server, tmp_path):
+    server.publish('a.fits', b'first')
+    cache = DiskCache(str(tmp_path), max_age=0)
+    cache.fetch(f'{server.url}/a.fits')
+    server.publish('a.fits', b'second version')
+    path = cache.fetch(f'{server.url}/a.fits')
+    assert read(path) == b'second version'
+    assert cache.metadata(f'{server.url}/a.fits')['etag'] == '"v2"'
+
+
+def test_server_errors_fall_back_to_the_cached_copy(server, tmp_path):
+    server.publish('a.fits', b'first')
+    cache = DiskCache(str(tmp_path), max_age=0)
+    cache.fetch(f'{server.url}/a.fits')
+    server.fail = True
+    assert read(cache.fetch(f'{server.url}/a.fits')) == b'first'
+    with pytest.raises(requests.RequestException):
+        cache.fetch(f'{server.url}/b.fits')
+
+
+def test_failed_download_leaves_no_partial_file(server, tmp_path, monkeypatch):
+    server.publish('a.fits', b'first')
+    cache = DiskCache(str(tmp_path), max_age=0)
+    path = cache.fetch(f'{server.url}/a.fits')
+    server.publish('a.fits', b'second version')
+
+    def broken(self, chunk_size=1, decode_unicode=False):
+        yield b'sec'
+        raise requests.ConnectionError('connection dropped')
+
+    monkeypatch.setattr(requests.Response, 'iter_content', broken)
+    with pytest.raises(requests.ConnectionError):
+        cache.fetch(f'{server.url}/a.fits')
+    assert read(path) == b'first'
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.tmp-')]
+
+
+def test_cleanup_removes_least_recently_used(server, tmp_path):
+    for name in 'abc':
+        server.publish(f'{name}.fits', name.encode() * 100)
+    cache = DiskCache(str(tmp_path), max_bytes=10**6, max_age=60)
+    paths = {}
+    for name in 'abc':
+        paths[name] = cache.fetch(f'{server.url}/{name}.fits')
+        # mtimes of the metadata files mark the last use
+        time.sleep(0.01)
+    cache.fetch(f'{server.url}/a.fits')
+
+    cache.max_bytes = 250
+    cache.cleanup()
+    assert os.path.exists(paths['a']) and os.path.exists(paths['c'])
+    assert not os.path.exists(paths['b'])
+    assert sorted(cache.urls()) == [f'{server.url}/a.fits', f'{server.url}/c.fits']
+
+
+def test_cleanup_keeps_the_file_just_fetched(server, tmp_path):
+    server.publish('a.fits', b'a' * 100)
+    cache = DiskCache(str(tmp_path), max_bytes=10, max_age=60)
+    path = cache.fetch(f'{server.url}/a.fits')
+    assert os.path.exists(path)
+
+
+def test_size_skips_vanished_files(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    (tmp_path / 'kept.data').write_bytes(b'x' * 10)
+    listdir = os.listdir
+    monkeypatch.setattr(os, 'listdir', lambda path: listdir(path) + ['gone.data'])
+    assert cache.size() == 10
+    cache.cleanup()
+
+
+def test_remote_planes_are_read_with_ranges(server, tmp_path):
+    cube, body = fits_file(0)
+    server.publish('a.fits', body)
+    data = RemoteFITS(f'{server.url}/a.fits', DiskCache(str(tmp_path)))
+    assert np.array_equal(data.plane('dolp', 1), cube[1])
+    # Only the requested plane was transferred
+    start = data.hdus['DOLP']['offset'] + cube[0].nbytes
+    assert server.requests[-1][1]['Range'] == f'bytes={start}-{start + cube[0].nbytes - 1}'
+    assert not os.listdir(tmp_path)
+
+
+def test_remote_files_without_ranges_are_read_from_the_disk_cache(server, tmp_path):
+    cube, body = fits_file(0)
+    server.publish('a.fits', body)
+    server.ranges = False
+    data = RemoteFITS(f'{server.url}/a.fits', DiskCache(str(tmp_path)))
+    assert np.array_equal(data.plane('dolp', 2), cube[2])
+    assert data.version == data._local.version
+
+
+def test_remote_files_of_the_same_size_have_different_versions(server, tmp_path):
+    # Without ETag and Last-Modified only the URL tells the files apart
+    server.etags = False
+    cubes = {}
+    for name, seed in [('a.fits', 0), ('b.fits', 1)]:
+        cubes[name], body = fits_file(seed)
+        server.publish(name, body)
+    cache = DiskCache(str(tmp_path))
+    a = RemoteFITS(f'{server.url}/a.fits', cache)
+    b = RemoteFITS(f'{server.url}/b.fits', cache)
+    assert a.size == b.size and a.validator is None and b.validator is None
+    assert a.version != b.version
+    assert np.array_equal(a.plane('dolp', 0), cubes['a.fits'][0])
+    assert np.array_equal(b.plane('dolp', 0), cubes['b.fits'][0])